@@ -0,0 +1,258 @@
+"""Micro-benchmarks for the hot paths of the integration.
+
+Reports operations per second and the peak memory allocated by one
+operation, for decoding and encoding registers, read planning, the read and
+write paths without I/O, the coordinator accessors and the entity setup
+loops of every platform.
+
+    python benchmarks/bench_micro.py
+    python benchmarks/bench_micro.py decode      # Only benchmarks whose name contains "decode"
+
+The coordinator and platform benchmarks need Home Assistant installed, and
+are skipped without it.
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from types import SimpleNamespace
+
+from simulator import load_driver
+
+# Each benchmark runs for at least this long
+MIN_TIME = 0.2
+
+BENCHMARKS = []
+
+def benchmark(name: str):
+    """Register an async setup function that returns the operation to measure."""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+async def measure(operation) -> tuple[float, int]:
+    """Return (operations per second, peak bytes allocated by one operation)."""
+    is_async = asyncio.iscoroutinefunction(operation)
+
+    async def run(loops: int) -> float:
+        start = time.perf_counter()
+        if is_async:
+            for _ in range(loops):
+                await operation()
+        else:
+            for _ in range(loops):
+                operation()
+        return time.perf_counter() - start
+
+    loops = 1
+    while (elapsed := await run(loops)) < MIN_TIME:
+        loops *= 2 if elapsed == 0 else max(2, min(10, int(MIN_TIME / elapsed) + 1))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await run(1)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return loops / elapsed, peak
+
+""" ******************************************************* """
+""" ************************ DEVICES ********************** """
+""" ******************************************************* """
+class FakeResponse():
+    def __init__(self, count: int = 0):
+        self.registers = [(i * 37) % 1000 for i in range(count)]
+        self.bits = [bool(i % 2) for i in range(count)]
+
+    def isError(self):
+        return False
+
+class FakeClient():
+    """Stands in for the bus connection, so only the integration's own work is measured."""
+    max_in_flight = 1
+
+    def __init__(self):
+        from custom_components.modbus_devices.devices.metrics import BusMetrics
+        self.metrics = BusMetrics()
+
+    async def connect(self):
+        pass
+
+    async def _read(self, address: int, count: int, **kwargs):
+        return FakeResponse(count)
+
+    async def _write(self, address: int, **kwargs):
+        return FakeResponse()
+
+    read_input_registers = read_holding_registers = read_coils = read_discrete_inputs = _read
+    write_coil = write_coils = write_register = write_registers = _write
+
+async def make_device(driver: str, first_read: bool = True):
+    """A driver instance on a fake client, after its first read unless told otherwise."""
+    from custom_components.modbus_devices.devices.connection import TCPConnectionParams
+
+    device = load_driver(driver)(TCPConnectionParams("127.0.0.1", 502))
+    device.close()
+    device._client = FakeClient()
+    if first_read:
+        await device.readData()
+    return device
+
+""" ******************************************************* """
+""" ******************** DECODE / ENCODE ****************** """
+""" ******************************************************* """
+@benchmark("codec decode int16")
+async def codec_decode_int16():
+    from custom_components.modbus_devices.devices.codec import ModbusCodec
+    from custom_components.modbus_devices.devices.datatypes import ModbusDatapoint
+    codec = ModbusCodec(ModbusDatapoint(Address=0, Scaling=0.1))
+    return lambda: codec.decode([1234])
+
+@benchmark("codec decode float32, little-endian words")
+async def codec_decode_float32():
+    from custom_components.modbus_devices.devices.codec import ModbusCodec
+    from custom_components.modbus_devices.devices.datatypes import ModbusDatapoint, ModbusFormat, ModbusOrder
+    codec = ModbusCodec(ModbusDatapoint(Address=0, Format=ModbusFormat.FLOAT32, WordOrder=ModbusOrder.LITTLE))
+    return lambda: codec.decode([0x0000, 0x3FC0])
+
+@benchmark("codec decode string, 15 registers")
+async def codec_decode_string():
+    from custom_components.modbus_devices.devices.codec import ModbusCodec
+    from custom_components.modbus_devices.devices.datatypes import ModbusDatapoint
+    codec = ModbusCodec(ModbusDatapoint(Address=0, Length=15))
+    registers = [ord(char) for char in "CASA R4 H E"] + [0] * 4
+    return lambda: codec.decode(registers)
+
+@benchmark("block decode, every CASA R4 block")
+async def block_decode_casa():
+    device = await make_device("Swegon.CASA_R4")
+    plan = device.getReadPlan([group for group in device.Datapoints if group.mode.value > 0])
+    blocks = [(block.decoder, FakeResponse(block.count).registers) for block in plan if not block.mode.is_bit]
+    def decode():
+        for decoder, registers in blocks:
+            decoder.decode(registers)
+    return decode
+
+@benchmark("codec encode int16, scaled")
+async def codec_encode_int16():
+    from custom_components.modbus_devices.devices.codec import ModbusCodec
+    from custom_components.modbus_devices.devices.datatypes import ModbusDatapoint
+    codec = ModbusCodec(ModbusDatapoint(Address=0, Scaling=0.1))
+    return lambda: codec.encode(21.5)
+
+@benchmark("codec encode float32")
+async def codec_encode_float32():
+    from custom_components.modbus_devices.devices.codec import ModbusCodec
+    from custom_components.modbus_devices.devices.datatypes import ModbusDatapoint, ModbusFormat
+    codec = ModbusCodec(ModbusDatapoint(Address=0, Format=ModbusFormat.FLOAT32))
+    return lambda: codec.encode(1.5)
+
+@benchmark("codec encode bit-field")
+async def codec_encode_bit():
+    from custom_components.modbus_devices.devices.codec import ModbusCodec
+    from custom_components.modbus_devices.devices.datatypes import ModbusDatapoint
+    codec = ModbusCodec(ModbusDatapoint(Address=0, Bit=4, BitLength=3))
+    return lambda: codec.encode(5, 0x1234)
+
+""" ******************************************************* """
+""" ******************** READ / WRITE PATH **************** """
+""" ******************************************************* """
+@benchmark("plan reads, ARCHUB with 12 zones")
+async def plan_archub():
+    from custom_components.modbus_devices.devices.datatypes import ModbusPollMode
+    from custom_components.modbus_devices.devices.planner import plan_reads
+    device = await make_device("LKSystems.ARCHUB", first_read=False)
+    device.Datapoints[next(iter(device.Datapoints))]["Number Of Zones"].Value = 12
+    device.onAfterFirstRead()
+    groups = [group for group in device.Datapoints if group.poll_mode == ModbusPollMode.POLL_ON]
+    return lambda: plan_reads(groups, device.Datapoints, device._maxReadGap)
+
+@benchmark("readData without I/O, CASA R4")
+async def read_data_casa():
+    device = await make_device("Swegon.CASA_R4")
+    return device.readData
+
+@benchmark("readData without I/O, ARCHUB with 12 zones")
+async def read_data_archub():
+    device = await make_device("LKSystems.ARCHUB", first_read=False)
+    device.Datapoints[next(iter(device.Datapoints))]["Number Of Zones"].Value = 12
+    device.onAfterFirstRead()
+    device.firstRead = False
+    return device.readData
+
+@benchmark("writeValues without I/O, 3 CASA R4 commands")
+async def write_values_casa():
+    device = await make_device("Swegon.CASA_R4")
+    commands = next(group for group, datapoints in device.Datapoints.items() if "Operating Mode" in datapoints)
+    writes = [(commands, "Operating Mode", 2), (commands, "Fireplace Mode", 1), (commands, "Travelling Mode", 0)]
+    async def write():
+        await device.writeValues(writes)
+    return write
+
+""" ******************************************************* """
+""" ************** COORDINATOR AND PLATFORMS ************** """
+""" ******************************************************* """
+async def make_coordinator(driver: str):
+    """A coordinator with just the state its accessors and the entities use."""
+    from custom_components.modbus_devices.coordinator import ModbusCoordinator
+    from custom_components.modbus_devices.devices.connection import TCPConnectionParams
+
+    device = load_driver(driver)(TCPConnectionParams("127.0.0.1", 502))
+    device.close()
+
+    coordinator = ModbusCoordinator.__new__(ModbusCoordinator)
+    coordinator._modbusDevice = device
+    coordinator._device = SimpleNamespace(id="benchmark", name="Benchmark", identifiers={("modbus_devices", "benchmark")})
+    coordinator._pending_writes = {}
+    coordinator._update_callbacks = {}
+    coordinator.config_selection = 0
+    return coordinator
+
+@benchmark("coordinator get_value")
+async def coordinator_get_value():
+    coordinator = await make_coordinator("Swegon.CASA_R4")
+    group, datapoints = next(iter(coordinator._modbusDevice.Datapoints.items()))
+    key = next(iter(datapoints))
+    return lambda: coordinator.get_value(group, key)
+
+@benchmark("coordinator get_attrs")
+async def coordinator_get_attrs():
+    coordinator = await make_coordinator("Swegon.CASA_R4")
+    group, datapoints = next(iter(coordinator._modbusDevice.Datapoints.items()))
+    key = next(iter(datapoints))
+    return lambda: coordinator.get_attrs(group, key)
+
+def platform_benchmark(platform: str):
+    async def setup():
+        import importlib
+        coordinator = await make_coordinator("Swegon.CASA_R4")
+        module = importlib.import_module(f"custom_components.modbus_devices.{platform}")
+        hass = SimpleNamespace(data={"modbus_devices": {"benchmark": coordinator}})
+        entry = SimpleNamespace(entry_id="benchmark")
+        async def setup_entry():
+            await module.async_setup_entry(hass, entry, lambda entities, update: None)
+        return setup_entry
+    benchmark(f"{platform} async_setup_entry, CASA R4")(setup)
+
+for platform in ("sensor", "binary_sensor", "number", "select", "switch", "button"):
+    platform_benchmark(platform)
+
+""" ******************************************************* """
+""" ************************* MAIN ************************ """
+""" ******************************************************* """
+async def main(filters: list[str]):
+    print(f"{'benchmark':<48} {'ops/s':>12} {'peak alloc':>12}")
+    for name, setup in BENCHMARKS:
+        if filters and not any(text in name for text in filters):
+            continue
+        try:
+            operation = await setup()
+        except ImportError as err:
+            print(f"{name:<48} skipped: {err}")
+            continue
+        ops, peak = await measure(operation)
+        print(f"{name:<48} {ops:>12,.0f} {peak:>10,} B")
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,119 @@
+"""End-to-end poll benchmark.
+
+Runs each driver against the simulator and measures ModbusDevice.readData:
+wall time, Modbus transactions and client CPU time per poll cycle, for a
+number of devices sharing one bus. The simulator runs in its own process,
+so the CPU time is that of the integration alone.
+
+    python benchmarks/bench_poll.py
+    python benchmarks/bench_poll.py --drivers Trox.TVE --devices 1 10 --baud 9600
+    python benchmarks/bench_poll.py --drivers Swegon.CASA_R4 --replay capture.jsonl.gz
+
+Needs Home Assistant installed, as the drivers import its constants.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from simulator import LatencyModel, ModbusSimulator, RegisterImage, load_driver
+
+DRIVERS = [
+    "Swegon.CASA_R4",
+    "Swegon.CASA_R15",
+    "LKSystems.ARCHUB",
+    "Trox.TVE",
+    "Renke.RS-WS-N01-8",
+]
+
+# Registers that decide what a driver does after its first read
+OVERRIDES = {
+    "LKSystems.ARCHUB": {("INPUT", 50): 12},    # Number Of Zones
+}
+
+def run_simulator(driver: str, devices: int, framer: str, baud_rate: int, response_delay: float, round_trip: float, replay: str, connection):
+    """Child process: serve one register image per slave, or a capture, until terminated."""
+    async def serve():
+        if replay:
+            from replay import BusCapture, ReplaySimulator
+            simulator = ReplaySimulator(BusCapture.load(replay), framer)
+        else:
+            image = RegisterImage.from_driver(load_driver(driver), OVERRIDES.get(driver))
+            simulator = ModbusSimulator({slave: image for slave in range(1, devices + 1)}, framer, LatencyModel(baud_rate, response_delay, round_trip))
+        connection.send(await simulator.start())
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+async def bench(driver: str, slaves: list[int], cycles: int, port: int, framer: str, max_in_flight: int, baud_rate: int) -> dict:
+    from custom_components.modbus_devices.devices.connection import TCPConnectionParams
+
+    device_class = load_driver(driver)
+    instances = [device_class(TCPConnectionParams("127.0.0.1", port, slave, framer, max_in_flight, baud_rate)) for slave in slaves]
+    bus = instances[0]._client
+    try:
+        # The first read also reads POLL_ONCE groups and sets up dynamic groups
+        await asyncio.gather(*(device.readData() for device in instances))
+
+        wall, cpu, transactions = [], [], []
+        for _ in range(cycles):
+            count = bus.metrics.transactions
+            start, start_cpu = time.perf_counter(), time.process_time()
+            # Like the coordinators, every device polls on its own
+            await asyncio.gather(*(device.readData() for device in instances))
+            wall.append(time.perf_counter() - start)
+            cpu.append(time.process_time() - start_cpu)
+            transactions.append(bus.metrics.transactions - count)
+    finally:
+        for device in instances:
+            device.close()
+
+    return {
+        "wall_ms": statistics.median(wall) * 1000,
+        "wall_p95_ms": sorted(wall)[int(0.95 * (len(wall) - 1))] * 1000,
+        "transactions": statistics.mean(transactions),
+        "cpu_ms": statistics.median(cpu) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drivers", nargs="+", default=DRIVERS)
+    parser.add_argument("--devices", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--framer", choices=["rtu", "socket"], default="rtu")
+    parser.add_argument("--max-in-flight", type=int, default=1)
+    parser.add_argument("--baud", type=int, default=None, help="Simulate a serial bus at this baud rate")
+    parser.add_argument("--response-delay", type=float, default=0, help="Simulated device response delay in seconds")
+    parser.add_argument("--round-trip", type=float, default=0, help="Simulated latency in seconds of every request, without serializing them")
+    parser.add_argument("--replay", help="Serve a capture of real bus traffic instead, to every slave that answered in it")
+    args = parser.parse_args()
+
+    if args.replay:
+        from replay import BusCapture
+        capture_slaves = sorted({record[2] for record in BusCapture.load(args.replay).records if record[6] is not None})
+        args.devices = [len(capture_slaves)]
+
+    print(f"{'driver':<20} {'devices':>7} {'cycle ms':>10} {'p95 ms':>10} {'trans/cycle':>12} {'cpu ms':>8}")
+    for driver in args.drivers:
+        for devices in args.devices:
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_simulator,
+                args=(driver, devices, args.framer, args.baud, args.response_delay, args.round_trip, args.replay, child),
+                daemon=True,
+            )
+            process.start()
+            try:
+                port = parent.recv()
+                slaves = capture_slaves if args.replay else list(range(1, devices + 1))
+                result = asyncio.run(bench(driver, slaves, args.cycles, port, args.framer, args.max_in_flight, args.baud))
+            finally:
+                process.terminate()
+                process.join()
+            print(
+                f"{driver:<20} {devices:>7} {result['wall_ms']:>10.2f} {result['wall_p95_ms']:>10.2f} "
+                f"{result['transactions']:>12.1f} {result['cpu_ms']:>8.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
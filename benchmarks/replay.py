@@ -0,0 +1,153 @@
+"""Replay a capture of real bus traffic.
+
+Captures are recorded by the modbus_devices.capture_traffic action. The
+replay server answers requests that were captured with the captured
+responses, in the order they were captured and with the captured latency.
+Requests that were never captured, like the blocks of a changed read
+planner, are answered from a register image built from every captured read,
+with a latency fitted to the captured transactions of that slave.
+
+    python benchmarks/replay.py capture.jsonl.gz                # Summary of a capture
+    python benchmarks/bench_poll.py --drivers Swegon.CASA_R4 --replay capture.jsonl.gz
+"""
+import argparse
+import asyncio
+import statistics
+import struct
+
+from collections import defaultdict, deque
+
+from simulator import ModbusSimulator, RegisterImage
+
+from custom_components.modbus_devices.devices.capture import BusCapture
+
+def frame_chars(function_code: int, request) -> int:
+    """RTU size of the request and response frames, as the connection counts them."""
+    if function_code in (1, 2):
+        return 8 + 5 + (request + 7) // 8
+    if function_code in (3, 4):
+        return 8 + 5 + 2 * request
+    if function_code == 15:
+        return 9 + (len(request) + 7) // 8 + 8
+    if function_code == 16:
+        return 9 + 2 * len(request) + 8
+    return 8 + 8
+
+def request_key(slave: int, pdu: bytes) -> tuple:
+    """Identify a request the same way for a captured record and a request PDU."""
+    function_code, address, value = pdu[0], *struct.unpack(">HH", pdu[1:5])
+    if function_code == 5:
+        value = int(value == 0xFF00)
+    elif function_code == 15:
+        value = tuple((pdu[6 + i // 8] >> (i % 8)) & 1 for i in range(value))
+    elif function_code == 16:
+        value = struct.unpack(f">{value}H", pdu[6:6 + 2 * value])
+    return (slave, function_code, address, value)
+
+def record_key(slave: int, function_code: int, address: int, request) -> tuple:
+    if isinstance(request, list):
+        request = tuple(int(value) for value in request)
+    elif function_code in (5, 6):
+        request = int(request)
+    return (slave, function_code, address, request)
+
+class ReplaySimulator(ModbusSimulator):
+    """Serve a capture back, with the captured responses and latencies."""
+    def __init__(self, capture: BusCapture, framer: str = "rtu", speed: float = 1.0):
+        super().__init__(self._images(capture), framer)
+        self.speed = speed
+        self.replayed = 0           # Requests answered from the capture
+        self.fitted = 0             # Requests answered from the register image
+
+        self._recorded = defaultdict(deque)
+        for _, duration, slave, function_code, address, request, response in capture.records:
+            self._recorded[record_key(slave, function_code, address, request)].append((duration, response))
+        self._latency = self._fit(capture)
+
+    @staticmethod
+    def _images(capture: BusCapture) -> dict[int, RegisterImage]:
+        images = defaultdict(RegisterImage)
+        for _, _, slave, function_code, address, request, response in capture.records:
+            if function_code > 4 or not isinstance(response, list):
+                continue
+            image = images[slave]
+            table = (image.coils, image.discrete_inputs, image.holding_registers, image.input_registers)[function_code - 1]
+            for i, value in enumerate(response):
+                table[address + i] = value
+        return dict(images)
+
+    @staticmethod
+    def _fit(capture: BusCapture) -> dict[int, tuple[float, float]]:
+        """Per slave (fixed seconds, seconds per char), by least squares over the answered transactions."""
+        samples = defaultdict(list)
+        for _, duration, slave, function_code, _, request, response in capture.records:
+            if response is not None:
+                samples[slave].append((frame_chars(function_code, request), duration))
+
+        latency = {}
+        for slave, points in samples.items():
+            chars, durations = zip(*points)
+            try:
+                per_char, fixed = statistics.linear_regression(chars, durations)
+            except statistics.StatisticsError:
+                per_char, fixed = 0, statistics.median(durations)
+            if per_char < 0 or fixed < 0:
+                per_char, fixed = 0, statistics.median(durations)
+            latency[slave] = (fixed, per_char)
+        return latency
+
+    async def _transact(self, slave: int, pdu: bytes) -> bytes | None:
+        self.requests += 1
+        recorded = self._recorded.get(request_key(slave, pdu))
+        if recorded:
+            # Repeated requests get the captured answers in turn, round and round
+            duration, result = recorded[0]
+            recorded.rotate(-1)
+            self.replayed += 1
+            if result is None:
+                return None     # The device never answered, let the client time out
+            if isinstance(result, str):
+                response = bytes([pdu[0] | 0x80, int(result) if result.isdigit() else 4])
+            elif isinstance(result, list) and pdu[0] in (1, 2):
+                data = bytearray((len(result) + 7) // 8)
+                for i, bit in enumerate(result):
+                    data[i // 8] |= bit << (i % 8)
+                response = bytes([pdu[0], len(data)]) + data
+            elif isinstance(result, list):
+                response = bytes([pdu[0], 2 * len(result)]) + struct.pack(f">{len(result)}H", *result)
+            else:
+                response = self.handle(slave, pdu)
+        else:
+            response = self.handle(slave, pdu)
+            if slave not in self._latency:
+                return response
+            fixed, per_char = self._latency[slave]
+            function_code, count = pdu[0], struct.unpack(">H", pdu[3:5])[0]
+            duration = fixed + per_char * frame_chars(function_code, [0] * count if function_code in (15, 16) else count)
+            self.fitted += 1
+
+        # The capture comes from a bus that carries one transaction at a time
+        async with self._bus:
+            await asyncio.sleep(duration / self.speed)
+        return response
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("capture")
+    args = parser.parse_args()
+
+    capture = BusCapture.load(args.capture)
+    simulator = ReplaySimulator(capture)
+    print(f"Bus {capture.bus}: {len(capture.records)} transactions over {capture.duration:.1f} s")
+    print(f"{'slave':>5} {'transactions':>12} {'timeouts':>9} {'exceptions':>11} {'median ms':>10} {'fixed ms':>9} {'us/char':>8}")
+    for slave in sorted({record[2] for record in capture.records}):
+        records = [record for record in capture.records if record[2] == slave]
+        fixed, per_char = simulator._latency.get(slave, (0, 0))
+        print(
+            f"{slave:>5} {len(records):>12} {sum(record[6] is None for record in records):>9} "
+            f"{sum(isinstance(record[6], str) for record in records):>11} "
+            f"{statistics.median(record[1] for record in records) * 1000:>10.2f} {fixed * 1000:>9.2f} {per_char * 1e6:>8.1f}"
+        )
+
+if __name__ == "__main__":
+    main()
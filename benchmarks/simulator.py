@@ -0,0 +1,219 @@
+"""A small Modbus slave simulator for benchmarks.
+
+Serves any number of slaves from in-memory register images over TCP, with
+either Modbus TCP (socket) framing or RTU framing as sent through a serial
+gateway. Latency can be injected to mimic a serial bus at a given baud rate:
+requests are then served one at a time, like on a real RS-485 line. A round
+trip latency is added to every request without serializing them, like the
+network and processing time of a Modbus TCP device that serves requests
+concurrently.
+
+Only what the integration uses is implemented: function codes 1-6, 15 and 16.
+"""
+import asyncio
+import importlib
+import os
+import struct
+import sys
+
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Drivers are imported through the integration package, like Home Assistant does
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# RTU characters are start + 8 data + stop bits, and frames are separated by 3.5 characters
+RTU_BITS_PER_CHAR = 10
+RTU_FRAME_GAP_CHARS = 3.5
+
+def load_driver(driver: str):
+    """Import the Device class of a driver, e.g. "Swegon.CASA_R4"."""
+    return importlib.import_module(f"custom_components.modbus_devices.devices.{driver}").Device
+
+def crc16(frame: bytes) -> int:
+    crc = 0xFFFF
+    for byte in frame:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+class RegisterImage():
+    """Coils, discrete inputs, input and holding registers of one slave. Unset addresses read as 0."""
+    def __init__(self):
+        self.coils = defaultdict(int)
+        self.discrete_inputs = defaultdict(int)
+        self.input_registers = defaultdict(int)
+        self.holding_registers = defaultdict(int)
+
+    @classmethod
+    def from_driver(cls, device_class, overrides: dict = None) -> "RegisterImage":
+        """Fill every datapoint a driver defines with a deterministic, non-zero value.
+
+        overrides maps (ModbusMode name, address) to a value, for registers that
+        decide what the driver does next, like the number of zones on an ARCHUB.
+        """
+        from custom_components.modbus_devices.devices.datatypes import ModbusMode
+
+        # loadDatapoints only fills in self.Datapoints, so no connection is needed
+        device = device_class.__new__(device_class)
+        device.Datapoints = {}
+        device.loadDatapoints()
+
+        image = cls()
+        tables = {
+            ModbusMode.COIL: image.coils,
+            ModbusMode.DISCRETE_INPUT: image.discrete_inputs,
+            ModbusMode.INPUT: image.input_registers,
+            ModbusMode.HOLDING: image.holding_registers,
+        }
+        for group, datapoints in device.Datapoints.items():
+            table = tables.get(group.mode)
+            if table is None:
+                continue
+            for dp in datapoints.values():
+                for address in range(dp.Address, dp.Address + dp.Length):
+                    table[address] = address % 2 if group.mode.is_bit else address % 100 + 1
+
+        for (mode, address), value in (overrides or {}).items():
+            tables[ModbusMode[mode]][address] = value
+        return image
+
+class LatencyModel():
+    """Time a request takes on the wire: the frames at a baud rate, plus the device response delay.
+
+    round_trip is added to every request, and is not shared by concurrent requests.
+    """
+    def __init__(self, baud_rate: int = None, response_delay: float = 0, round_trip: float = 0):
+        self.baud_rate = baud_rate
+        self.response_delay = response_delay
+        self.round_trip = round_trip
+
+    @property
+    def serial(self) -> bool:
+        return self.baud_rate is not None or self.response_delay > 0
+
+    def delay(self, request_chars: int, response_chars: int) -> float:
+        delay = self.response_delay
+        if self.baud_rate:
+            delay += (request_chars + response_chars + 2 * RTU_FRAME_GAP_CHARS) * RTU_BITS_PER_CHAR / self.baud_rate
+        return delay
+
+class ModbusSimulator():
+    """Serve register images over TCP.
+
+    With framer="rtu", frames carry the slave address and CRC as on a serial
+    line, which is what a TCP to RS-485 gateway passes through. With
+    framer="socket", frames have the Modbus TCP (MBAP) header.
+    """
+    def __init__(self, images: dict[int, RegisterImage], framer: str = "rtu", latency: LatencyModel = None):
+        self.images = images
+        self.framer = framer
+        self.latency = latency or LatencyModel()
+        self.requests = 0
+        self._bus = asyncio.Lock()
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Start serving, and return the port."""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    """ ******************************************************* """
+    """ *********************** FRAMING *********************** """
+    """ ******************************************************* """
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                if self.framer == "socket":
+                    header = await reader.readexactly(7)
+                    transaction, _, length, slave = struct.unpack(">HHHB", header)
+                    pdu = await reader.readexactly(length - 1)
+                else:
+                    head = await reader.readexactly(7)
+                    slave, function = head[0], head[1]
+                    # Multiple writes carry a byte count, everything else is 8 bytes
+                    rest = head[6] + 2 if function in (15, 16) else 1
+                    frame = head + await reader.readexactly(rest)
+                    if crc16(frame[:-2]) != struct.unpack("<H", frame[-2:])[0]:
+                        continue
+                    pdu = frame[1:-2]
+
+                response = await self._transact(slave, pdu)
+                if response is None:
+                    continue
+                if self.framer == "socket":
+                    writer.write(struct.pack(">HHHB", transaction, 0, len(response) + 1, slave) + response)
+                else:
+                    frame = bytes([slave]) + response
+                    writer.write(frame + struct.pack("<H", crc16(frame)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _transact(self, slave: int, pdu: bytes) -> bytes | None:
+        """Answer one request, taking as long as the latency model says."""
+        self.requests += 1
+        response = self.handle(slave, pdu)
+        if self.latency.round_trip:
+            await asyncio.sleep(self.latency.round_trip)
+        if not self.latency.serial:
+            return response
+
+        # A serial bus carries one transaction at a time
+        async with self._bus:
+            await asyncio.sleep(self.latency.delay(len(pdu) + 3, len(response or b"") + 3))
+        return response
+
+    """ ******************************************************* """
+    """ ******************* REQUEST HANDLING ****************** """
+    """ ******************************************************* """
+    def handle(self, slave: int, pdu: bytes) -> bytes | None:
+        """Return the response PDU, or None for no response at all."""
+        image = self.images.get(slave)
+        if image is None:
+            return None     # Nobody on the bus answers to that address
+
+        function = pdu[0]
+        if function in (1, 2):
+            address, count = struct.unpack(">HH", pdu[1:5])
+            table = image.coils if function == 1 else image.discrete_inputs
+            data = bytearray((count + 7) // 8)
+            for i in range(count):
+                if table[address + i]:
+                    data[i // 8] |= 1 << (i % 8)
+            return bytes([function, len(data)]) + data
+        if function in (3, 4):
+            address, count = struct.unpack(">HH", pdu[1:5])
+            table = image.holding_registers if function == 3 else image.input_registers
+            return bytes([function, 2 * count]) + struct.pack(f">{count}H", *(table[address + i] for i in range(count)))
+        if function == 5:
+            address, value = struct.unpack(">HH", pdu[1:5])
+            image.coils[address] = int(value == 0xFF00)
+            return pdu[:5]
+        if function == 6:
+            address, value = struct.unpack(">HH", pdu[1:5])
+            image.holding_registers[address] = value
+            return pdu[:5]
+        if function == 15:
+            address, count = struct.unpack(">HH", pdu[1:5])
+            for i in range(count):
+                image.coils[address + i] = (pdu[6 + i // 8] >> (i % 8)) & 1
+            return pdu[:5]
+        if function == 16:
+            address, count = struct.unpack(">HH", pdu[1:5])
+            for i, value in enumerate(struct.unpack(f">{count}H", pdu[6:6 + 2 * count])):
+                image.holding_registers[address + i] = value
+            return pdu[:5]
+
+        # Illegal function
+        return bytes([function | 0x80, 1])
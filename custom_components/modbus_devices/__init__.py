@@ -1,9 +1,11 @@
 """Support for Modbus devices."""
 import logging
+import time
 
 from functools import partial
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.device_registry import DeviceEntry
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers import entity_registry as er
@@ -17,11 +19,17 @@ from .const import (
     CONF_DEVICE_MODEL,
     CONF_IP,
     CONF_PORT,
+    CONF_FRAMER,
+    CONF_MAX_IN_FLIGHT,
+    CONF_GATEWAY_BAUD,
     CONF_SERIAL_PORT,
     CONF_SERIAL_BAUD,
     CONF_SLAVE_ID,
     CONF_SCAN_INTERVAL,
-    CONF_SCAN_INTERVAL_FAST
+    CONF_SCAN_INTERVAL_FAST,
+    FRAMER_RTU,
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_GATEWAY_BAUD
 )
 
 from .const import DeviceMode
@@ -60,11 +68,15 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
         ip = entry.data[CONF_IP]
         port = entry.data[CONF_PORT]
         slave_id = entry.data[CONF_SLAVE_ID]
-        connection_params = TCPConnectionParams(ip, port, slave_id)
+        framer = entry.data.get(CONF_FRAMER, FRAMER_RTU)
+        max_in_flight = entry.data.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT)
+        gateway_baud = entry.data.get(CONF_GATEWAY_BAUD, DEFAULT_GATEWAY_BAUD)
+        connection_params = TCPConnectionParams(ip, port, slave_id, framer, max_in_flight, gateway_baud)
     elif device_mode == DeviceMode.RTU:
         serial_port = entry.data[CONF_SERIAL_PORT]
         baudrate = entry.data[CONF_SERIAL_BAUD]
-        connection_params = RTUConnectionParams(serial_port, baudrate) 
+        slave_id = entry.data[CONF_SLAVE_ID]
+        connection_params = RTUConnectionParams(serial_port, baudrate, slave_id)
     else:
         _LOGGER.error(f"Unsupported device mode: {device_mode}")
         return False    
@@ -86,7 +98,13 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     
     # Might throw ConfigEntryNotReady, which should cause retry later
     # Or ConfigEntryError, which will cause integration to halt permanently.
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        # Release the shared bus connection, a retry will acquire it again
+        hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_shutdown()
+        raise
 
     # Forward the setup to the platforms.
     hass.async_create_task(
@@ -98,6 +116,8 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     # Register services
     hass.services.async_register(DOMAIN, "request_update",partial(service_request_update, hass))
+    hass.services.async_register(DOMAIN, "dump_trace", partial(service_dump_trace, hass), supports_response=SupportsResponse.ONLY)
+    hass.services.async_register(DOMAIN, "capture_traffic", partial(service_capture_traffic, hass), supports_response=SupportsResponse.OPTIONAL)
     
     return True
 
@@ -119,11 +139,40 @@ async def service_request_update(hass, call: ServiceCall):
     """Find the coordinator corresponding to the given device ID."""
     for entry_id, coordinator in hass.data[DOMAIN].items():
         if getattr(coordinator, "device_id", None) == device_id:
-            await coordinator._async_update_data()
+            await coordinator.request_update()
             return
 
     _LOGGER.warning("No coordinator found for device ID %s", device_id)
 
+# Service-call to dump recent bus transactions
+async def service_dump_trace(hass, call: ServiceCall) -> ServiceResponse:
+    """Return the recent transactions on the bus of a specific device."""
+    device_id = call.data.get("device_id")
+    for entry_id, coordinator in hass.data[DOMAIN].items():
+        if getattr(coordinator, "device_id", None) == device_id:
+            return {"transactions": coordinator.get_trace()}
+
+    _LOGGER.warning("No coordinator found for device ID %s", device_id)
+    return {"transactions": []}
+
+# Service-call to record bus traffic for replay
+async def service_capture_traffic(hass, call: ServiceCall) -> ServiceResponse:
+    """Record the transactions on the bus of a specific device to a file in the config directory."""
+    device_id = call.data.get("device_id")
+    duration = call.data.get("duration", 60)
+    for entry_id, coordinator in hass.data[DOMAIN].items():
+        if getattr(coordinator, "device_id", None) == device_id:
+            path = hass.config.path(f"{DOMAIN}_capture_{time.strftime('%Y%m%d_%H%M%S')}.jsonl.gz")
+            try:
+                transactions = await coordinator.capture_traffic(duration, path)
+            except RuntimeError as err:
+                raise HomeAssistantError(str(err)) from err
+            _LOGGER.info("Captured %s transactions to %s", transactions, path)
+            return {"path": path, "transactions": transactions}
+
+    _LOGGER.warning("No coordinator found for device ID %s", device_id)
+    return {"path": None, "transactions": 0}
+
 async def update_listener(hass: HomeAssistant, entry: ConfigEntry):
     _LOGGER.debug("Updating Modbus Devices entry!")
     await hass.config_entries.async_reload(entry.entry_id)
@@ -136,7 +185,8 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
 
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.async_shutdown()
 
     return unload_ok
 
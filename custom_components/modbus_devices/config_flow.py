@@ -13,10 +13,11 @@ from typing import Any
 from .const import DOMAIN, CONF_DEVICE_MODE, CONF_NAME, CONF_DEVICE_MODEL, CONF_IP, CONF_PORT, CONF_SLAVE_ID, CONF_SCAN_INTERVAL, CONF_SCAN_INTERVAL_FAST
 from .const import CONF_MODE_SELECTION, CONF_ADD_TCPIP, CONF_ADD_RTU
 from .const import CONF_SERIAL_PORT, CONF_SERIAL_BAUD
+from .const import CONF_FRAMER, CONF_MAX_IN_FLIGHT, CONF_GATEWAY_BAUD, FRAMER_RTU, FRAMER_SOCKET, DEFAULT_MAX_IN_FLIGHT, DEFAULT_GATEWAY_BAUD
 from .const import DeviceMode
 from .const import DEFAULT_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL_FAST
 
-from .devices.helpers import get_available_drivers
+from .devices.helpers import get_driver_infos
 
 CONFIG_ENTRY_NAME = "Modbus Devices"
 
@@ -26,6 +27,9 @@ DEVICE_DATA_TCPIP = {
     CONF_DEVICE_MODEL: None,
     CONF_IP: "192.168.1.1",
     CONF_PORT: 502,
+    CONF_FRAMER: FRAMER_RTU,
+    CONF_MAX_IN_FLIGHT: DEFAULT_MAX_IN_FLIGHT,
+    CONF_GATEWAY_BAUD: DEFAULT_GATEWAY_BAUD,
     CONF_SLAVE_ID: 1,
     CONF_SCAN_INTERVAL: DEFAULT_SCAN_INTERVAL,
     CONF_SCAN_INTERVAL_FAST: DEFAULT_SCAN_INTERVAL_FAST
@@ -128,6 +132,10 @@ class ModbusOptionsFlowHandler(OptionsFlow):
 """                     Static schemas                  """
 """ ################################################### """
 MODE_VALUES = [CONF_ADD_TCPIP, CONF_ADD_RTU]
+FRAMER_VALUES = [FRAMER_RTU, FRAMER_SOCKET]
+BAUD_RATES = [9600, 14400, 19200, 38400, 57600, 115200, 230400, 460800, 921600]
+# The serial side of a gateway is often slower, and 0 leaves it unknown
+GATEWAY_BAUD_RATES = [DEFAULT_GATEWAY_BAUD, 1200, 2400, 4800] + BAUD_RATES
 MODE_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_MODE_SELECTION): selector.SelectSelector(
@@ -151,7 +159,7 @@ async def getDeviceSchema(user_input: dict[str, Any] | None = None, ports = None
 
 # Schema taking device details when adding or updating tcp/ip device
 async def getTcpIpDeviceSchema(user_input: dict[str, Any] | None = None) -> vol.Schema:
-    DEVICE_MODELS = sorted(await get_available_drivers())
+    DEVICE_MODELS = await getDeviceModelOptions()
 
     data_schema = vol.Schema(
         {
@@ -159,6 +167,9 @@ async def getTcpIpDeviceSchema(user_input: dict[str, Any] | None = None) -> vol.
             vol.Required(CONF_DEVICE_MODEL, default=user_input[CONF_DEVICE_MODEL]): selector.SelectSelector(selector.SelectSelectorConfig(options=DEVICE_MODELS)),     
             vol.Required(CONF_IP, description="IP Address", default=user_input[CONF_IP]): cv.string,
             vol.Optional(CONF_PORT, description="Port", default=user_input[CONF_PORT]): vol.All(vol.Coerce(int), vol.Range(min=0, max=65535)),
+            vol.Optional(CONF_FRAMER, default=user_input.get(CONF_FRAMER, FRAMER_RTU)): selector.SelectSelector(selector.SelectSelectorConfig(options=FRAMER_VALUES, translation_key=CONF_FRAMER)),
+            vol.Optional(CONF_MAX_IN_FLIGHT, default=user_input.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT)): vol.All(vol.Coerce(int), vol.Range(min=1, max=16)),
+            vol.Optional(CONF_GATEWAY_BAUD, default=user_input.get(CONF_GATEWAY_BAUD, DEFAULT_GATEWAY_BAUD)): vol.In(GATEWAY_BAUD_RATES),
             vol.Optional(CONF_SLAVE_ID, description="Slave ID", default=user_input[CONF_SLAVE_ID]): vol.All(vol.Coerce(int), vol.Range(min=0, max=256)),
             vol.Optional(CONF_SCAN_INTERVAL, default=user_input[CONF_SCAN_INTERVAL]): vol.All(vol.Coerce(int), vol.Range(min=5, max=999)),
             vol.Optional(CONF_SCAN_INTERVAL_FAST, default=user_input[CONF_SCAN_INTERVAL_FAST]): vol.All(vol.Coerce(int), vol.Range(min=1, max=999)),
@@ -169,15 +180,14 @@ async def getTcpIpDeviceSchema(user_input: dict[str, Any] | None = None) -> vol.
 
 # Schema taking device details when adding or updating RTU device
 async def getRtuDeviceSchema(user_input: dict[str, Any] | None = None, ports = None) -> vol.Schema:
-    DEVICE_MODELS = sorted(await get_available_drivers())
-    baud_rates = [9600, 14400, 19200, 38400, 57600, 115200, 230400, 460800, 921600]
+    DEVICE_MODELS = await getDeviceModelOptions()
 
     data_schema = vol.Schema(
         {
             vol.Required(CONF_NAME, description="Name", default=user_input[CONF_NAME]): cv.string,
             vol.Required(CONF_DEVICE_MODEL, default=user_input[CONF_DEVICE_MODEL]): selector.SelectSelector(selector.SelectSelectorConfig(options=DEVICE_MODELS)),     
             vol.Required(CONF_SERIAL_PORT, description="Serial Port", default=user_input[CONF_SERIAL_PORT]): vol.In(ports),
-            vol.Required(CONF_SERIAL_BAUD, description="Baud Rate", default=user_input[CONF_SERIAL_BAUD]): vol.In(baud_rates),
+            vol.Required(CONF_SERIAL_BAUD, description="Baud Rate", default=user_input[CONF_SERIAL_BAUD]): vol.In(BAUD_RATES),
             vol.Required(CONF_SLAVE_ID, description="Slave ID", default=user_input[CONF_SLAVE_ID]): vol.All(vol.Coerce(int), vol.Range(min=0, max=256)),
             vol.Optional(CONF_SCAN_INTERVAL, default=user_input[CONF_SCAN_INTERVAL]): vol.All(vol.Coerce(int), vol.Range(min=5, max=999)),
             vol.Optional(CONF_SCAN_INTERVAL_FAST, default=user_input[CONF_SCAN_INTERVAL_FAST]): vol.All(vol.Coerce(int), vol.Range(min=1, max=999)),
@@ -189,6 +199,11 @@ async def getRtuDeviceSchema(user_input: dict[str, Any] | None = None, ports = N
 """ ################################################### """
 """                         HELPERS                     """
 """ ################################################### """
+async def getDeviceModelOptions() -> list[selector.SelectOptionDict]:
+    # Drivers are listed by manufacturer and model, from an index that is only rebuilt when drivers change
+    infos = sorted(await get_driver_infos(), key=lambda info: info.label.lower())
+    return [selector.SelectOptionDict(value=info.driver, label=info.label) for info in infos]
+
 async def async_get_ports():
     # Run the blocking glob call in a separate thread to avoid blocking the event loop
     try:
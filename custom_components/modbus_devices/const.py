@@ -16,6 +16,8 @@ CONF_SCAN_INTERVAL_FAST: str = "scan_interval_fast"
 # Defaults
 DEFAULT_SCAN_INTERVAL: int = 300  # Seconds
 DEFAULT_SCAN_INTERVAL_FAST: int = 5  # Seconds
+DEFAULT_MAX_IN_FLIGHT: int = 1  # Requests
+DEFAULT_GATEWAY_BAUD: int = 0  # Unknown
 
 # Configuration mode selection
 CONF_MODE_SELECTION = "mode_selection"
@@ -26,6 +28,13 @@ CONF_ADD_RTU = "add_rtu"
 CONF_TCPIP: str = "tcpip"
 CONF_IP: str = "ip_address"
 CONF_PORT: str = "port"
+CONF_FRAMER: str = "framer"
+CONF_MAX_IN_FLIGHT: str = "max_in_flight"
+CONF_GATEWAY_BAUD: str = "gateway_baud"
+
+# TCP framing, RTU frames through a gateway or Modbus TCP (MBAP) frames
+FRAMER_RTU: str = "rtu"
+FRAMER_SOCKET: str = "socket"
 
 # Configuration SERIAL Constants
 CONF_SERIAL: str = "serial"
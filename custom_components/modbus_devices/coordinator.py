@@ -1,16 +1,37 @@
+import asyncio
 import async_timeout
 import datetime as dt
 import logging
+import time
 import traceback
 
+from homeassistant.core import callback
+from pymodbus.exceptions import ConnectionException
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed, ConfigEntryNotReady, ConfigEntryError
 
 from .devices.helpers import load_device_class
-from .devices.datatypes import ModbusDefaultGroups
+from .devices.connection import PRIORITY_POLL, PRIORITY_USER
+from .devices.datatypes import ModbusDefaultGroups, ModbusPollMode
 
 _LOGGER = logging.getLogger(__name__)
 
+# Seconds to collect writes, so that contiguous ones share a transaction
+WRITE_WINDOW = 0.05
+# Seconds a debounced write waits for a newer value, and the longest it can be postponed
+WRITE_DEBOUNCE = 0.5
+WRITE_DEBOUNCE_MAX = 2.0
+
+# Failed polls in a row before the device is considered unreachable
+CIRCUIT_FAILURES = 3
+# Seconds between probes of an unreachable device, doubled after every failed probe.
+# Never shorter than the device's own tick interval, so probing is never more traffic than polling.
+CIRCUIT_BACKOFF_MIN = 10
+CIRCUIT_BACKOFF_MAX = 300
+# Lower cap while the bus itself is down, so polling resumes soon after the link is back
+CIRCUIT_BACKOFF_LINK_MAX = 60
+PROBE_TIMEOUT = 5
+
 class ModbusCoordinator(DataUpdateCoordinator):    
     def __init__(self, hass, device, device_model:str, connection_params, scan_interval, scan_interval_fast):
         """Initialize coordinator parent"""
@@ -26,8 +47,6 @@ class ModbusCoordinator(DataUpdateCoordinator):
         self.device_model = device_model
         self.connection_params = connection_params
 
-        self._fast_poll_enabled = False
-        self._fast_poll_count = 0
         self._normal_poll_interval = scan_interval
         self._fast_poll_interval = scan_interval_fast
 
@@ -35,6 +54,36 @@ class ModbusCoordinator(DataUpdateCoordinator):
 
         self._modbusDevice = None
 
+        # Scheduler state, when each group is due to be polled next
+        self._next_poll = {}
+        self._tick_interval = scan_interval
+        # Priority of the next poll on the bus, raised when a user asks for it
+        self._poll_priority = PRIORITY_POLL
+
+        # Datapoints changed by the last poll, None notifies every entity
+        self._changed = None
+        self._notify_all = True
+
+        # Writes collected during the write window: (group, key) -> (value, futures).
+        # A newer value for the same key replaces the pending one.
+        self._pending_writes = {}
+        self._write_task = None
+        self._write_started = 0
+        self._write_due = 0
+
+        # Health of the device. While the circuit is open, only probes are sent.
+        self._failures = 0
+        self._circuit_open = False
+        self._backoff = CIRCUIT_BACKOFF_MIN
+
+        # Running capture of the bus traffic, and the event that ends it early
+        self._capture = None
+        self._capture_stop = None
+
+        # Watches polled quickly after a write: [watch, deadline, stable polls]
+        self._active_watches = []
+        self._watch_task = None
+
         # Storage for config selection
         self.config_selection = 0
 
@@ -52,6 +101,16 @@ class ModbusCoordinator(DataUpdateCoordinator):
         else:
             raise ConfigEntryError
 
+    async def async_shutdown(self) -> None:
+        await super().async_shutdown()
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        # End a running capture while the device still has its connection
+        self._stop_capture()
+        if self._modbusDevice is not None:
+            self._modbusDevice.close()
+
     @property
     def device_id(self):
         return self._device.id
@@ -64,38 +123,122 @@ class ModbusCoordinator(DataUpdateCoordinator):
     def identifiers(self):
         return self._device.identifiers
 
-    def setFastPollMode(self):
-        _LOGGER.debug("Enabling fast poll mode")
-        self._fast_poll_enabled = True
-        self._fast_poll_count = 0
-        self.update_interval = dt.timedelta(seconds=self._fast_poll_interval)
-        self._schedule_refresh()
+    ################################
+    ########## Scheduler ###########
+    ################################
+    def _get_poll_interval(self, group) -> float:
+        return group.poll_interval or self._normal_poll_interval
 
-    def setNormalPollMode(self):
-        _LOGGER.debug("Enabling normal poll mode")
-        self._fast_poll_enabled = False
-        self.update_interval = dt.timedelta(seconds=self._normal_poll_interval)
+    def _get_due_groups(self, now: float) -> list:
+        """Return the POLL_ON groups that are due at this tick."""
+        # Allow half a tick of jitter, so a group isn't pushed a full tick late
+        tolerance = self._tick_interval / 2
+        return [
+            group for group in self._modbusDevice.Datapoints
+            if group.poll_mode == ModbusPollMode.POLL_ON
+            and now >= self._next_poll.get(group, 0) - tolerance
+        ]
 
+    def _update_tick_interval(self):
+        """Tick as often as the most frequently polled group needs."""
+        intervals = [
+            self._get_poll_interval(group) for group in self._modbusDevice.Datapoints
+            if group.poll_mode == ModbusPollMode.POLL_ON
+        ]
+        tick_interval = min(intervals, default=self._normal_poll_interval)
+        if tick_interval != self._tick_interval:
+            _LOGGER.debug("Scheduler tick interval is now %s seconds", tick_interval)
+            self._tick_interval = tick_interval
+            if not self._circuit_open:
+                self.update_interval = dt.timedelta(seconds=tick_interval)
+
+    async def request_update(self):
+        """Poll all groups now, regardless of their schedule."""
+        self._next_poll.clear()
+        self._poll_priority = PRIORITY_USER
+        await self.async_refresh()
 
     async def _async_update_data(self):
         _LOGGER.debug("Coordinator updating data for: %s", self.devicename) 
 
-        """ Counter for fast polling """
-        if self._fast_poll_enabled:
-            self._fast_poll_count += 1
-            if self._fast_poll_count > 5:
-                self.setNormalPollMode()
+        """ Probe an unreachable device instead of polling it """
+        if self._circuit_open:
+            await self._probe()
 
         """ Fetch data """
+        now = time.monotonic()
+        due_groups = self._get_due_groups(now)
+        priority, self._poll_priority = self._poll_priority, PRIORITY_POLL
+        self._changed = None
         try:
-            async with async_timeout.timeout(20):
-                await self._modbusDevice.readData()
+            self._changed = await self._modbusDevice.readData(due_groups, priority)
         except Exception as err:
             _LOGGER.debug("Failed when fetching data: %s", traceback.format_exc())
+            self._record_failure()
             raise UpdateFailed("Could not read data from device!") from err
-        
+        self._failures = 0
+
+        for group in due_groups:
+            self._next_poll[group] = now + self._get_poll_interval(group)
+        self._update_tick_interval()
+
         await self._async_update_deviceInfo()
 
+    ################################
+    ####### Circuit breaker ########
+    ################################
+    def _record_failure(self):
+        """Stop polling a device that keeps failing, so it doesn't hold up the bus."""
+        self._failures += 1
+        if self._failures >= CIRCUIT_FAILURES and not self._circuit_open:
+            self._backoff = max(CIRCUIT_BACKOFF_MIN, self._tick_interval)
+            _LOGGER.warning("%s is not responding, retrying in %s seconds", self.devicename, self._backoff)
+            self._circuit_open = True
+            self.update_interval = dt.timedelta(seconds=self._backoff)
+
+    async def _probe(self):
+        """Read a single register, and close the circuit if the device responds."""
+        try:
+            async with async_timeout.timeout(PROBE_TIMEOUT):
+                await self._modbusDevice.probe()
+        except Exception as err:
+            limit = CIRCUIT_BACKOFF_LINK_MAX if isinstance(err, ConnectionException) else CIRCUIT_BACKOFF_MAX
+            self._backoff = max(min(self._backoff * 2, limit), self._tick_interval)
+            self.update_interval = dt.timedelta(seconds=self._backoff)
+            _LOGGER.debug("Probe of %s failed, retrying in %s seconds: %s", self.devicename, self._backoff, err)
+            raise UpdateFailed(f"Device is not responding, retrying in {self._backoff} seconds") from err
+
+        _LOGGER.info("%s is responding again", self.devicename)
+        self._circuit_open = False
+        self._failures = 0
+        self._backoff = CIRCUIT_BACKOFF_MIN
+        self.update_interval = dt.timedelta(seconds=self._tick_interval)
+        # Everything is stale, so poll all groups right away
+        self._next_poll.clear()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Only notify entities whose datapoint changed in the last poll.
+
+        Every entity is notified when availability changes, since that is
+        decided by whether the poll succeeded and not by the datapoint.
+        """
+        changed = self._changed
+        self._changed = None
+        if self._notify_all or changed is None or not self.last_update_success:
+            self._notify_all = not self.last_update_success
+            super().async_update_listeners()
+            return
+
+        self._async_update_key_listeners(changed, include_unkeyed=True)
+
+    @callback
+    def _async_update_key_listeners(self, keys: set, include_unkeyed: bool = False) -> None:
+        """Notify the entities listening to the given (group, key) pairs."""
+        for update_callback, context in list(self._listeners.values()):
+            if context in keys or (include_unkeyed and context is None):
+                update_callback()
+
     async def _async_update_deviceInfo(self) -> None:
         device_registry = dr.async_get(self.hass)
         device_registry.async_update_device(
@@ -131,18 +274,174 @@ class ModbusCoordinator(DataUpdateCoordinator):
     ######### Read / Write #########
     ################################   
     def get_value(self, group, key):
+        if self._pending_writes:
+            pending = self._pending_writes.get((group, key))
+            if pending is not None:
+                return pending[0]
         if group in self._modbusDevice.Datapoints:
             if key in self._modbusDevice.Datapoints[group]:
                 return self._modbusDevice.Datapoints[group][key].Value
         return None
 
+    def get_trace(self) -> list[dict]:
+        """Recent transactions on the bus this device is on."""
+        return self._modbusDevice.getTrace()
+
+    async def capture_traffic(self, duration: float, path: str) -> int:
+        """Record the transactions on the bus for duration seconds to a file, and return how many there were."""
+        capture = self._modbusDevice.startCapture()
+        self._capture, self._capture_stop = capture, asyncio.Event()
+        try:
+            await asyncio.wait_for(self._capture_stop.wait(), duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._stop_capture()
+        if capture.full:
+            _LOGGER.warning("Capture of %s stopped after %s transactions", self.devicename, len(capture.records))
+        await self.hass.async_add_executor_job(capture.save, path)
+        return len(capture.records)
+
+    def _stop_capture(self):
+        """Stop the running capture, when the duration is over or the device is shut down."""
+        if self._capture is None:
+            return
+        self._capture = None
+        self._capture_stop.set()
+        self._modbusDevice.stopCapture()
+
     def get_attrs(self, group, key):
         if group in self._modbusDevice.Datapoints:
             if key in self._modbusDevice.Datapoints[group]:
                 return self._modbusDevice.Datapoints[group][key].Attrs
         return None
 
-    async def write_value(self, group, key, value) -> bool:
+    async def write_value(self, group, key, value, debounce: bool = False):
+        """Queue a write, and wait until it has been written to the device.
+
+        Debounced writes wait a little longer for a newer value to the same
+        datapoint, in which case only the newest value is written. Until then
+        get_value returns the pending value.
+        """
         _LOGGER.debug("Write_Data: %s - %s - %s", group, key, value)
-        await self._modbusDevice.writeValue(group, key, value)
-        self.setFastPollMode()
+        loop = self.hass.loop
+        now = loop.time()
+        future = loop.create_future()
+
+        pending = self._pending_writes.get((group, key))
+        futures = pending[1] if pending is not None else []
+        futures.append(future)
+        self._pending_writes[(group, key)] = (value, futures)
+
+        # The write window is set before the flush task exists, since Home
+        # Assistant starts tasks eagerly and the flush runs up to its first sleep here
+        if self._write_task is None:
+            self._write_started = now
+            self._write_due = now
+        delay = WRITE_DEBOUNCE if debounce else WRITE_WINDOW
+        self._write_due = min(max(self._write_due, now + delay), self._write_started + WRITE_DEBOUNCE_MAX)
+        if self._write_task is None:
+            self._write_task = self.hass.async_create_task(self._flush_writes())
+
+        # Show the pending value right away
+        self._async_update_key_listeners({(group, key)})
+        await future
+
+    async def _flush_writes(self):
+        loop = self.hass.loop
+        # Always yield at least once, so the caller has stored this task before it finishes
+        await asyncio.sleep(max(self._write_due - loop.time(), 0))
+        while (delay := self._write_due - loop.time()) > 0:
+            await asyncio.sleep(delay)
+
+        writes = self._pending_writes
+        self._pending_writes = {}
+        self._write_task = None
+
+        try:
+            results = await self._modbusDevice.writeValues([(group, key, value) for (group, key), (value, _) in writes.items()])
+        except Exception as err:
+            results = [err] * len(writes)
+
+        # Read back only what the writes affected, instead of polling the whole device
+        written = [dp_key for dp_key, error in zip(writes, results) if error is None]
+        changed = set(writes)
+        try:
+            changed |= await self._modbusDevice.readBack(written)
+        except Exception as err:
+            _LOGGER.debug("Failed to read back written values: %s", err)
+
+        # Callers whose value was replaced get the result of the newest one
+        for (_, futures), error in zip(writes.values(), results):
+            for future in futures:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+        self._async_update_key_listeners(changed, include_unkeyed=True)
+        self._start_watches(written)
+
+    ################################
+    ########### Watches ############
+    ################################
+    def _start_watches(self, written: list):
+        """Start the driver's watches triggered by the written datapoints."""
+        deadline = self.hass.loop.time()
+        # By group identity, as groups with the same mode and poll mode compare equal
+        written = {(id(group), key) for group, key in written}
+        for watch in self._modbusDevice.watches:
+            if not any((id(group), key) in written for group, key in watch.Triggers):
+                continue
+            # A new write restarts a watch that is already running
+            self._active_watches = [active for active in self._active_watches if active[0] is not watch]
+            self._active_watches.append([watch, deadline + watch.Timeout, 0])
+
+        if self._active_watches and self._watch_task is None:
+            self._watch_task = self.hass.async_create_task(self._poll_watches())
+
+    async def _poll_watches(self):
+        """Poll only the watched datapoints at the fast interval until they settle."""
+        try:
+            while self._active_watches:
+                await asyncio.sleep(self._fast_poll_interval)
+                if self._circuit_open:
+                    self._active_watches = []
+                    break
+
+                keys = list(dict.fromkeys(dp_key for watch, _, _ in self._active_watches for dp_key in watch.Datapoints))
+                try:
+                    changed = await self._modbusDevice.readDatapoints(keys)
+                except Exception as err:
+                    _LOGGER.debug("Failed to poll watched datapoints: %s", err)
+                    changed = None
+                if changed:
+                    self._async_update_key_listeners(changed, include_unkeyed=True)
+
+                now = self.hass.loop.time()
+                active_watches = []
+                for active in self._active_watches:
+                    watch, deadline, stable = active
+                    if changed is not None:
+                        active[2] = 0 if any(dp_key in changed for dp_key in watch.Datapoints) else stable + 1
+                    if self._watch_settled(watch, active[2]) or now >= deadline:
+                        _LOGGER.debug("Watch on %s settled", watch.Datapoints)
+                        continue
+                    active_watches.append(active)
+                self._active_watches = active_watches
+        finally:
+            self._watch_task = None
+
+    def _watch_settled(self, watch, stable: int) -> bool:
+        if stable >= watch.StableSamples:
+            return True
+        if watch.Actual is None or watch.Target is None:
+            return False
+        actual = self._modbusDevice.Datapoints[watch.Actual[0]][watch.Actual[1]].Value
+        target = self._modbusDevice.Datapoints[watch.Target[0]][watch.Target[1]].Value
+        try:
+            return abs(actual - target) <= watch.Tolerance
+        except TypeError:
+            return actual == target
@@ -1,7 +1,7 @@
 import logging
 
 from ..modbusdevice import ModbusDevice
-from ..datatypes import ModbusDatapoint, ModbusGroup, ModbusDefaultGroups, ModbusMode, ModbusPollMode
+from ..datatypes import ModbusDatapoint, ModbusGroup, ModbusDefaultGroups, ModbusMode, ModbusPollMode, ModbusFormat
 from ..datatypes import ModbusSensorData, ModbusNumberData, ModbusSelectData
 
 from homeassistant.const import UnitOfTemperature, UnitOfTime
@@ -29,7 +29,7 @@ class Device(ModbusDevice):
     def loadDatapoints(self):
         # DEVICE_INFO - Read-only
         self.Datapoints[GROUP_DEVICE_INFO] = {
-            "Serial Number": ModbusDatapoint(Address=0, Length=4),     # 4 registers for a 64-bit value
+            "Serial Number": ModbusDatapoint(Address=0, Format=ModbusFormat.UINT64),
             "Software Version Major": ModbusDatapoint(Address=4),
             "Software Version Minor": ModbusDatapoint(Address=5),
             "Software Version Micro": ModbusDatapoint(Address=6),
@@ -77,10 +77,7 @@ class Device(ModbusDevice):
 
     def onAfterFirstRead(self):
         # Update device info
-#       serial_registers = self.Datapoints[GROUP_DEVICE_INFO]["Serial Number"].Value
-#       packed_bytes = struct.pack('>HHHH', *serial_registers)
-#       self.serial_number = struct.unpack('>Q', packed_bytes)[0]
-        self.serial_number=42
+        self.serial_number = self.Datapoints[GROUP_DEVICE_INFO]["Serial Number"].Value
         number_of_zones = self.Datapoints[GROUP_DEVICE_INFO]["Number Of Zones"].Value
 
         a = self.Datapoints[GROUP_DEVICE_INFO]["Software Version Major"].Value
@@ -27,6 +27,12 @@ class Device(ModbusDevice):
     manufacturer = "Swegon"
     model = "CASA R4"
 
+    # Commands change the unit statuses, and resetting alarms clears the alarms
+    write_dependencies = {
+        GROUP_COMMANDS: [GROUP_UNIT_STATUSES],
+        GROUP_COMMANDS2: [GROUP_ALARMS],
+    }
+
     def loadDatapoints(self):
         # COMMANDS - Read/Write
         self.Datapoints[GROUP_COMMANDS] = {
@@ -127,7 +133,6 @@ class Device(ModbusDevice):
             "Exhaust Fan": ModbusDatapoint(Address=6303, DataType=ModbusSensorData(units=PERCENTAGE)),
             "Supply_Fan_RPM": ModbusDatapoint(Address=6304),
             "Exhaust_Fan_RPM": ModbusDatapoint(Address=6305),
-            "NotUsed": ModbusDatapoint(Address=6306, Length=10),
             "Heating Output": ModbusDatapoint(Address=6316, DataType=ModbusSensorData(units=PERCENTAGE)),            
         }
 
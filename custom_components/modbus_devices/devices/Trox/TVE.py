@@ -1,7 +1,7 @@
 import logging
 
 from ..modbusdevice import ModbusDevice
-from ..datatypes import ModbusDatapoint, ModbusGroup, ModbusDefaultGroups, ModbusMode, ModbusPollMode
+from ..datatypes import ModbusDatapoint, ModbusGroup, ModbusDefaultGroups, ModbusMode, ModbusPollMode, ModbusWatch
 from ..datatypes import ModbusSensorData, ModbusNumberData, ModbusSelectData, ModbusBinarySensorData
 
 from homeassistant.const import UnitOfVolumeFlowRate, UnitOfElectricPotential, UnitOfTime
@@ -22,6 +22,21 @@ class Device(ModbusDevice):
     manufacturer="Trox"
     model="TVE"
 
+    # Register 569 sets a response delay of up to 255 ms. Timeouts allow for twice
+    # the expected time, so 100 ms covers the whole range without slowing polls.
+    response_delay = 0.1
+
+    # Follow the damper until the flow reaches the setpoint, or it stops moving
+    watches = [
+        ModbusWatch(
+            Triggers=[(GROUP_0, "Setpoint Flowrate"), (GROUP_0, "Override"), (GROUP_0, "Command")],
+            Datapoints=[(GROUP_0, "Position"), (GROUP_0, "Position Degrees"), (GROUP_0, "Flowrate Percent"), (GROUP_0, "Flowrate Actual")],
+            Actual=(GROUP_0, "Flowrate Percent"),
+            Target=(GROUP_0, "Setpoint Flowrate"),
+            Tolerance=1,
+        ),
+    ]
+
     def loadDatapoints(self):
         # GROUP 0
         self.Datapoints[GROUP_0] = {
@@ -38,7 +53,10 @@ class Device(ModbusDevice):
         # DEVICE_INFO - Read-only
         self.Datapoints[GROUP_DEVICE_INFO] = {
             "FW": ModbusDatapoint(Address=103),
-            "Status": ModbusDatapoint(Address=104)
+            "Status": ModbusDatapoint(Address=104),
+            "Mechanical Overload": ModbusDatapoint(Address=104, Bit=4),
+            "Internal Activity": ModbusDatapoint(Address=104, Bit=7),
+            "Bus Timeout": ModbusDatapoint(Address=104, Bit=9),
         }
 
         # CONFIGURATION - Read/Write
@@ -80,16 +98,16 @@ class Device(ModbusDevice):
         self.sw_version = self.Datapoints[GROUP_DEVICE_INFO]["FW"].Value
 
         # Handle alarms
-        alarms = self.Datapoints[GROUP_DEVICE_INFO]["Status"].Value
+        status = self.Datapoints[GROUP_DEVICE_INFO]
 
         actAlarm = False
         attrs = {}
-        if (alarms & (1 << 4)) != 0:
+        if status["Mechanical Overload"].Value:
             attrs.update({"Mechanical Overload":"ALARM"})
             actAlarm = True
-        if (alarms & (1 << 7)) != 0:
+        if status["Internal Activity"].Value:
             attrs.update({"Internal Activity":"WARNING"})
-        if (alarms & (1 << 9)) != 0:
+        if status["Bus Timeout"].Value:
             attrs.update({"Bus Timeout":"WARNING"})
 
         self.Datapoints[GROUP_UI]["Active Alarms"].Value = actAlarm
@@ -0,0 +1,57 @@
+import gzip
+import json
+import time
+
+# Bumped when the layout of a record changes
+CAPTURE_VERSION = 1
+
+# Records kept in memory, the capture stops recording when it is full
+CAPTURE_MAX_RECORDS = 20000
+
+class BusCapture():
+    """Request/response pairs on one bus, with their timing, for replay elsewhere.
+
+    A capture file is gzipped JSON lines: a header, then one record per
+    transaction as [offset, duration, slave, function code, address, request, response].
+    Offset and duration are seconds. The request is the count for reads and the
+    written value(s) for writes. The response is the registers or bits read,
+    True for an acknowledged write, the exception code as a string, or None if
+    the device never answered.
+    """
+    def __init__(self, bus: str = ""):
+        self.bus = bus
+        self.started = time.time()
+        self.records = []
+        self._start = time.monotonic()
+
+    @property
+    def full(self) -> bool:
+        return len(self.records) >= CAPTURE_MAX_RECORDS
+
+    def record(self, start: float, end: float, slave: int, function_code: int, address: int, request, response):
+        """Record one transaction, start and end in time.monotonic() seconds."""
+        if self.full:
+            return
+        self.records.append((round(start - self._start, 6), round(end - start, 6), slave, function_code, address, request, response))
+
+    def save(self, path: str):
+        """Write the capture to a file. Blocking, so run it in an executor."""
+        with gzip.open(path, "wt", encoding="utf-8") as file:
+            file.write(json.dumps({"version": CAPTURE_VERSION, "bus": self.bus, "started": self.started}) + "\n")
+            for record in self.records:
+                file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "BusCapture":
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            header = json.loads(file.readline())
+            if header.get("version") != CAPTURE_VERSION:
+                raise ValueError(f"Unsupported capture version {header.get('version')} in {path}")
+            capture = cls(header.get("bus", ""))
+            capture.started = header.get("started", 0)
+            capture.records = [tuple(json.loads(line)) for line in file if line.strip()]
+        return capture
+
+    @property
+    def duration(self) -> float:
+        return max((offset + duration for offset, duration, *_ in self.records), default=0)
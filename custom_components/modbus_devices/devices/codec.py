@@ -0,0 +1,208 @@
+import logging
+import struct
+
+from .datatypes import ModbusDatapoint, ModbusFormat, ModbusOrder
+
+_LOGGER = logging.getLogger(__name__)
+
+STRUCT_CODES = {
+    ModbusFormat.UINT16: "H",
+    ModbusFormat.INT16: "h",
+    ModbusFormat.UINT32: "I",
+    ModbusFormat.INT32: "i",
+    ModbusFormat.UINT64: "Q",
+    ModbusFormat.INT64: "q",
+    ModbusFormat.FLOAT32: "f",
+    ModbusFormat.FLOAT64: "d",
+}
+
+def default_format(length: int) -> ModbusFormat:
+    if length == 1:
+        return ModbusFormat.INT16
+    if length == 2:
+        return ModbusFormat.INT32
+    return ModbusFormat.STRING
+
+class ModbusCodec():
+    """Converts between registers and the value of a datapoint, compiled once.
+
+    Values in big-endian byte and word order are unpacked directly from the
+    register buffer. Other orders are read as raw registers and rearranged
+    before they are unpacked.
+    """
+    def __init__(self, dp: ModbusDatapoint):
+        self.format = dp.Format or default_format(dp.Length)
+        self.length = dp.Length
+        self.scaling = dp.Scaling
+
+        self._swap_bytes = dp.ByteOrder == ModbusOrder.LITTLE
+        self._swap_words = dp.WordOrder == ModbusOrder.LITTLE and self.length > 1
+        self._words = struct.Struct(f">{self.length}H")
+
+        if self.format == ModbusFormat.STRING:
+            self.code, self.items = f"{self.length}H", self.length
+        elif self.format == ModbusFormat.ASCII:
+            self.code, self.items = f"{self.length * 2}s", 1
+        else:
+            self.code, self.items = STRUCT_CODES[self.format], 1
+        self._struct = struct.Struct(">" + self.code)
+
+        # Without a Format, writes accept signed and unsigned values and wrap them, like raw registers
+        self._wrap = None
+        if dp.Format is None and self.format in (ModbusFormat.INT16, ModbusFormat.INT32):
+            self._wrap = 16 * self.length
+
+        # Bit-fields are read as the raw register and shifted out of it
+        self.bit = dp.Bit
+        if self.bit is not None:
+            self._mask = (1 << dp.BitLength) - 1
+            self.code, self._struct = "H", struct.Struct(">H")
+            self._swap_words = False
+
+        self._convert = self._converter()
+
+    @property
+    def native(self) -> bool:
+        """True if the value can be unpacked straight from big-endian registers."""
+        return not (self._swap_bytes or self._swap_words)
+
+    """ ******************************************************* """
+    """ ************************ DECODE *********************** """
+    """ ******************************************************* """
+    def field(self) -> tuple[str, int, callable]:
+        """Return (struct format, items, converter) to decode within a block."""
+        if self.native:
+            return self.code, self.items, self._convert
+        if self.length == 1:
+            return "H", 1, lambda word: self._decode_words((word,))
+        return self._words.format[1:], self.length, self._decode_words
+
+    def decode(self, registers: list[int]):
+        """Decode the registers of this datapoint into its value."""
+        if self.native:
+            values = self._struct.unpack(self._words.pack(*registers))
+            value = values[0] if self.items == 1 else values
+            return value if self._convert is None else self._convert(value)
+        return self._decode_words(registers)
+
+    def _converter(self):
+        if self.bit is not None:
+            bit, mask, scaling = self.bit, self._mask, self.scaling
+            if scaling == 1:
+                return lambda value: (value >> bit) & mask
+            return lambda value: ((value >> bit) & mask) * scaling
+        if self.format == ModbusFormat.STRING:
+            return lambda values: ''.join(map(chr, values)).rstrip('\x00')
+        if self.format == ModbusFormat.ASCII:
+            return lambda value: value.decode("latin-1").rstrip('\x00')
+        if self.scaling == 1:
+            return None
+        scaling = self.scaling
+        return lambda value: value * scaling
+
+    def _reorder(self, words) -> list[int]:
+        # Both are their own inverse, so they serve encoding as well
+        if self._swap_words:
+            words = words[::-1]
+        if self._swap_bytes:
+            words = [((word & 0xFF) << 8) | (word >> 8) for word in words]
+        return words
+
+    def _decode_words(self, words):
+        values = self._struct.unpack(self._words.pack(*self._reorder(words)))
+        value = values[0] if self.items == 1 else values
+        return value if self._convert is None else self._convert(value)
+
+    """ ******************************************************* """
+    """ ************************ ENCODE *********************** """
+    """ ******************************************************* """
+    def encode(self, value, current: int = None) -> list[int]:
+        """Encode a value into the registers of this datapoint.
+
+        Bit-fields are merged into current, the register as it is on the device.
+        """
+        if self.bit is not None:
+            field = round(value / self.scaling)
+            if field < 0 or field > self._mask:
+                raise ValueError(f"Value {value} does not fit in a {self._mask.bit_length()}-bit field")
+            register = self._reorder([current])[0]
+            register = (register & ~(self._mask << self.bit)) | (field << self.bit)
+            return self._reorder([register])
+
+        if self.format == ModbusFormat.STRING:
+            words = [ord(char) for char in str(value)[:self.length]]
+            words += [0] * (self.length - len(words))
+        elif self.format == ModbusFormat.ASCII:
+            raw = str(value).encode("latin-1")[:self.length * 2].ljust(self.length * 2, b'\x00')
+            words = list(self._words.unpack(raw))
+        else:
+            raw = value / self.scaling
+            if self.format not in (ModbusFormat.FLOAT32, ModbusFormat.FLOAT64):
+                raw = round(raw)
+            if self._wrap is not None and -(1 << (self._wrap - 1)) <= raw < (1 << self._wrap):
+                raw &= (1 << self._wrap) - 1
+                words = [(raw >> (16 * i)) & 0xFFFF for i in reversed(range(self.length))]
+                return self._reorder(words)
+            try:
+                words = list(self._words.unpack(self._struct.pack(raw)))
+            except struct.error as err:
+                raise ValueError(f"Value {value} can't be written as {self.format.value}") from err
+
+        return self._reorder(words)
+
+class BlockDecoder():
+    """Decode plan for one read block, compiled once.
+
+    The registers of a response are packed into one buffer and all datapoints
+    are unpacked from it with a single precompiled struct. Datapoints that
+    overlap an earlier one get their own struct, as one format can't read the
+    same bytes twice.
+    """
+    def __init__(self, address: int, count: int, datapoints: list):
+        self._registers = struct.Struct(f">{count}H")
+
+        fmt = [">"]
+        self._steps = []
+        self._extras = []
+        position = 0
+        index = 0
+        for group, key, dp in sorted(datapoints, key=lambda entry: entry[2].Address):
+            offset = dp.Address - address
+            code, items, convert = ModbusCodec(dp).field()
+
+            if offset < position:
+                self._extras.append((dp, struct.Struct(">" + code), offset * 2, items, convert))
+                continue
+            if offset > position:
+                fmt.append(f"{(offset - position) * 2}x")
+
+            fmt.append(code)
+            self._steps.append((dp, index, items, convert))
+            index += items
+            position = offset + dp.Length
+
+        self._struct = struct.Struct("".join(fmt))
+
+    def decode(self, registers: list[int]):
+        """Update the value of every datapoint in the block."""
+        buffer = self._registers.pack(*registers)
+
+        values = self._struct.unpack_from(buffer)
+        for dp, index, items, convert in self._steps:
+            value = values[index] if items == 1 else values[index:index + items]
+            dp.Value = value if convert is None else convert(value)
+
+        for dp, extra, offset, items, convert in self._extras:
+            values = extra.unpack_from(buffer, offset)
+            value = values[0] if items == 1 else values
+            dp.Value = value if convert is None else convert(value)
+
+class BitBlockDecoder():
+    """Decode plan for a block of coils or discrete inputs, one bit per datapoint."""
+    def __init__(self, address: int, datapoints: list):
+        self._steps = [(dp, dp.Address - address) for group, key, dp in datapoints]
+
+    def decode(self, bits: list[bool]):
+        """Update the value of every datapoint in the block."""
+        for dp, offset in self._steps:
+            dp.Value = int(bits[offset])
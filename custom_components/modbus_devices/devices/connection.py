@@ -1,15 +1,481 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import logging
+import random
+import time
+
+from typing import Awaitable, Callable, Dict
+
+from pymodbus.client import AsyncModbusTcpClient, AsyncModbusSerialClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+from pymodbus.framer import FramerType
+
+from .capture import BusCapture
+from .metrics import BusMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds between reconnect attempts, doubled after every failed attempt
+RECONNECT_DELAY_MIN = 1
+RECONNECT_DELAY_MAX = 60
+
+# Per-request timeouts are the expected time of the transaction on the wire
+# times a safety factor, plus a margin for USB adapters and OS scheduling.
+# RTU characters are start + 8 data + stop bits, and every frame is preceded
+# by 3.5 characters of silence.
+RTU_BITS_PER_CHAR = 10
+RTU_FRAME_GAP_CHARS = 3.5
+TIMEOUT_FACTOR = 2
+TIMEOUT_MARGIN = 0.1
+# Behind a TCP gateway whose serial baud rate isn't configured, the speed of the serial side is unknown
+TCP_TIMEOUT = 1.0
+# Upper bound for pymodbus itself, the per-request timeout is what applies
+CLIENT_TIMEOUT = 10
+
+# Requests waiting for the bus are served by priority, then in order of arrival.
+# User actions go ahead of background polling.
+PRIORITY_USER = 0
+PRIORITY_POLL = 1
+
+# Transactions kept in the trace of each bus
+TRACE_SIZE = 500
+
+FUNCTION_CODES = {
+    "read_coils": 1,
+    "read_discrete_inputs": 2,
+    "read_holding_registers": 3,
+    "read_input_registers": 4,
+    "write_coil": 5,
+    "write_register": 6,
+    "write_coils": 15,
+    "write_registers": 16,
+}
+
+def _discard_received(client):
+    """Drop bytes the client has received but not parsed, like part of a late frame.
+
+    pymodbus has no public call for this short of closing the connection, so
+    this clears the receive buffer of its transaction manager, client.ctx, as
+    it is in pymodbus 3.16. If that changes, the buffer is left alone.
+    """
+    ctx = getattr(client, "ctx", None)
+    if isinstance(getattr(ctx, "recv_buffer", None), bytes):
+        ctx.recv_buffer = b""
+    else:
+        _LOGGER.debug("Can't discard received data on this version of pymodbus")
+
 class ConnectionParams:
     """Base class for connection parameters."""
-    pass
+    baud_rate = None
+    @property
+    def key(self) -> tuple:
+        """Identifies the physical bus. Devices with equal keys share one connection."""
+        raise NotImplementedError
 
 class TCPConnectionParams(ConnectionParams):
-    def __init__(self, ip: str, port: int, slave_id: int = 1):
+    def __init__(self, ip: str, port: int, slave_id: int = 1, framer: str = "rtu", max_in_flight: int = 1, baud_rate: int | None = None):
         self.ip = ip
         self.port = port
         self.slave_id = slave_id
+        self.framer = framer                # "rtu" (through a gateway) | "socket" (Modbus TCP)
+        self.max_in_flight = max_in_flight  # Concurrent requests, only with "socket" framing
+        self.baud_rate = baud_rate or None  # Serial side of a gateway, None if unknown
+
+    @property
+    def key(self) -> tuple:
+        return ("tcp", self.ip, self.port)
 
 class RTUConnectionParams(ConnectionParams):
     def __init__(self, serial_port: str, baud_rate: int, slave_id: int = 1):
         self.serial_port = serial_port
         self.baud_rate = baud_rate
-        self.slave_id = slave_id
\ No newline at end of file
+        self.slave_id = slave_id
+
+    @property
+    def key(self) -> tuple:
+        return ("rtu", self.serial_port)
+
+class ModbusConnection():
+    """One client per physical bus, shared by every device on that bus.
+
+    All transactions are queued for an idle client, so requests from different
+    devices never collide mid-frame on the wire. The queue is served by
+    priority, so a write doesn't wait for a poll of every device on the bus.
+    Modbus TCP devices may allow several requests in flight, in which case a
+    small pool of sockets is used.
+
+    A dropped connection is re-established in the background, and devices can
+    register a keepalive read that is sent when the bus has been idle.
+    """
+    def __init__(self, connection_params: ConnectionParams):
+        if isinstance(connection_params, TCPConnectionParams):
+            framer = FramerType(connection_params.framer)
+            max_in_flight = connection_params.max_in_flight
+            if framer != FramerType.SOCKET and max_in_flight > 1:
+                _LOGGER.warning("Concurrent requests need Modbus TCP framing, using one request at a time to %s", connection_params.ip)
+                max_in_flight = 1
+            # Only Modbus TCP framing has transaction ids to tell a late response from the current one
+            self._untagged = framer != FramerType.SOCKET
+            self._clients = [
+                AsyncModbusTcpClient(host=connection_params.ip, port=connection_params.port, framer=framer, reconnect_delay=0, timeout=CLIENT_TIMEOUT, retries=0)
+                for _ in range(max_in_flight)
+            ]
+        elif isinstance(connection_params, RTUConnectionParams):
+            self._untagged = True
+            self._clients = [AsyncModbusSerialClient(port=connection_params.serial_port, baudrate=connection_params.baud_rate, reconnect_delay=0, timeout=CLIENT_TIMEOUT, retries=0)]
+        else:
+            raise ValueError("Unsupported connection parameters")
+
+        self.key = connection_params.key
+        self.params = connection_params
+        self.users = 0
+        self.max_in_flight = len(self._clients)
+
+        self._connect_lock = asyncio.Lock()
+        self._idle = list(self._clients)
+        self._waiters = []                  # Heap of (priority, sequence, future)
+        self._sequence = itertools.count()
+
+        self._closed = False
+        self._reconnect_task = None
+
+        # Keepalive reads: [interval, probe], sent when the bus has been idle
+        self._keepalives = []
+        self._keepalive_task = None
+        self._last_activity = 0
+
+        self.metrics = BusMetrics()
+
+        # Recent transactions: (start, end, function code, slave, address, count, retries, outcome)
+        self.trace = collections.deque(maxlen=TRACE_SIZE)
+
+        # Request/response pairs while a capture is running
+        self.capture = None
+
+    @property
+    def connected(self) -> bool:
+        """True while the bus can be used, that is while at least one client is connected."""
+        return any(client.connected for client in self._clients)
+
+    async def connect(self):
+        """Connect every client, and keep trying in the background if that fails."""
+        async with self._connect_lock:
+            for client in self._clients:
+                if not client.connected:
+                    _LOGGER.debug("Connecting to bus %s", self.key)
+                    await client.connect()
+            self._shrink_pool()
+        if not self.connected:
+            self._schedule_reconnect()
+            raise ConnectionException(f"Could not connect to bus {self.key}")
+
+    def close(self):
+        _LOGGER.debug("Closing bus %s", self.key)
+        self._closed = True
+        for task in (self._reconnect_task, self._keepalive_task):
+            if task is not None:
+                task.cancel()
+        for client in self._clients:
+            client.close()
+
+    """ ******************************************************* """
+    """ ***************** RECONNECT / KEEPALIVE *************** """
+    """ ******************************************************* """
+    def _schedule_reconnect(self):
+        if self._closed or self._reconnect_task is not None:
+            return
+        _LOGGER.warning("Lost connection to bus %s, reconnecting", self.key)
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Reconnect dropped clients, backing off with jitter so devices don't retry in lockstep."""
+        delay = RECONNECT_DELAY_MIN
+        try:
+            while not self._closed:
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+                for client in self._clients:
+                    if not client.connected:
+                        client.close()
+                        async with self._connect_lock:
+                            await client.connect()
+                if self.connected:
+                    self._shrink_pool()
+                    _LOGGER.info("Reconnected to bus %s", self.key)
+                    return
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+                _LOGGER.debug("Reconnect to bus %s failed, retrying in about %s seconds", self.key, delay)
+        finally:
+            self._reconnect_task = None
+
+    def _shrink_pool(self):
+        """Drop the clients that are not connected while others are.
+
+        Gateways often limit the number of sockets, so the connections they
+        refuse or close are given up on, and fewer requests are sent at a time.
+        """
+        refused = [client for client in self._clients if not client.connected]
+        if not refused or len(refused) == len(self._clients):
+            return
+        for client in refused:
+            self._clients.remove(client)
+            if client in self._idle:
+                self._idle.remove(client)
+            client.close()
+        self.max_in_flight = len(self._clients)
+        _LOGGER.warning("Bus %s refused %s connection(s), sending up to %s request(s) at a time", self.key, len(refused), self.max_in_flight)
+
+    def add_keepalive(self, interval: float, probe: Callable[[], Awaitable]):
+        """Call probe whenever the bus has been idle for interval seconds."""
+        self._keepalives.append([interval, probe])
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.get_running_loop().create_task(self._keepalive())
+
+    def remove_keepalive(self, probe: Callable[[], Awaitable]):
+        self._keepalives = [keepalive for keepalive in self._keepalives if keepalive[1] != probe]
+
+    async def _keepalive(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while not self._closed and self._keepalives:
+                interval, probe = min(self._keepalives, key=lambda keepalive: keepalive[0])
+                idle = loop.time() - self._last_activity
+                if idle < interval:
+                    await asyncio.sleep(interval - idle)
+                    continue
+                if not self.connected:
+                    # The reconnect task is already on it
+                    self._last_activity = loop.time()
+                    continue
+                _LOGGER.debug("Bus %s idle for %.0f seconds, sending keepalive", self.key, idle)
+                try:
+                    await probe()
+                except Exception as err:
+                    _LOGGER.debug("Keepalive on bus %s failed: %s", self.key, err)
+                # A probe that sent nothing, like that of a device with nothing to poll,
+                # must not make this loop spin without ever sleeping
+                self._last_activity = loop.time()
+        finally:
+            self._keepalive_task = None
+
+    """ ******************************************************* """
+    """ ********** QUEUED TRANSACTIONS ON THE CLIENT ********** """
+    """ ******************************************************* """
+    def timeout(self, request_chars: int, response_chars: int, response_delay: float) -> float:
+        """Seconds to wait for the response to a request, from the frame sizes in bytes."""
+        if not self.params.baud_rate:
+            return TCP_TIMEOUT + response_delay
+        char_time = RTU_BITS_PER_CHAR / self.params.baud_rate
+        wire_time = (request_chars + response_chars + 2 * RTU_FRAME_GAP_CHARS) * char_time
+        return TIMEOUT_FACTOR * (wire_time + response_delay) + TIMEOUT_MARGIN
+
+    async def _acquire(self, priority: int):
+        """Wait for an idle client, ahead of requests with a lower priority."""
+        if self._idle and not self._waiters:
+            return self._idle.pop()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Pass the client on if it was handed over just as we were cancelled
+            if future.done() and not future.cancelled():
+                self._release(future.result())
+            raise
+
+    def _release(self, client):
+        if client not in self._clients:
+            return      # Dropped from the pool while it was in use
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(client)
+                return
+        self._idle.append(client)
+
+    async def _execute(self, method: str, request_chars: int, response_chars: int, response_delay: float, retries: int, priority: int, **kwargs):
+        """Run one request on an idle client, retrying lost frames up to retries times."""
+        timeout = self.timeout(request_chars, response_chars, response_delay)
+        client = await self._acquire(priority)
+        # Gateways may also close the extra connections right after accepting them
+        while not client.connected and self.connected:
+            self._shrink_pool()
+            client = await self._acquire(priority)
+        start = time.monotonic()
+        attempt = 0
+        sent = 0                            # Attempts that actually went out on the bus
+        timed_out = failed = False
+        outcome = "ok"
+        response = None
+        try:
+            while True:
+                if not client.connected:
+                    self._schedule_reconnect()
+                    raise ConnectionException(f"Not connected to bus {self.key}")
+                try:
+                    sent += 1
+                    response = await asyncio.wait_for(getattr(client, method)(**kwargs), timeout)
+                    if response.isError():
+                        failed = True
+                        outcome = f"exception {getattr(response, 'exception_code', '?')}"
+                    elif not self._matches(method, response, kwargs):
+                        response = None
+                        raise ModbusIOException(f"Response to {method} on bus {self.key} doesn't match the request")
+                    return response
+                except (asyncio.TimeoutError, ModbusIOException) as err:
+                    if self._untagged and client.connected:
+                        await self._drain(client, timeout)
+                    if attempt == retries:
+                        timed_out = True
+                        outcome = "timeout"
+                        raise ModbusIOException(f"No response to {method} on bus {self.key} within {timeout:.3f} s") from err
+                    attempt += 1
+                    _LOGGER.debug("No response to %s on bus %s, retrying", method, self.key)
+                finally:
+                    if not client.connected:
+                        self._schedule_reconnect()
+        except Exception as err:
+            failed = True
+            if not timed_out:
+                outcome = f"error {type(err).__name__}"
+            raise
+        finally:
+            end = time.monotonic()
+            if sent:
+                self.metrics.record_transaction(kwargs["device_id"], start, end, (request_chars + response_chars) * sent, sent - 1, timed_out, failed)
+            else:
+                self.metrics.record_unsent(kwargs["device_id"])
+            count = kwargs.get("count", len(kwargs["values"]) if "values" in kwargs else 1)
+            self.trace.append((start, end, FUNCTION_CODES[method], kwargs["device_id"], kwargs["address"], count, attempt, outcome))
+            if self.capture is not None and sent:
+                self._capture(method, start, end, response, kwargs)
+            self._last_activity = asyncio.get_running_loop().time()
+            self._release(client)
+
+    async def _drain(self, client, timeout: float):
+        """Let a late response arrive and be discarded, so it isn't taken as the response to the next request.
+
+        The client is still held, so nothing else is sent meanwhile. pymodbus
+        ignores frames that arrive with no request waiting for them.
+        """
+        await asyncio.sleep(timeout)
+        _discard_received(client)
+
+    @staticmethod
+    def _matches(method: str, response, kwargs: dict) -> bool:
+        """Whether a response has the size of the one expected, and is for the address written."""
+        if method in ("read_holding_registers", "read_input_registers"):
+            return len(response.registers) == kwargs["count"]
+        if method in ("read_coils", "read_discrete_inputs"):
+            # Bits come in whole bytes
+            return len(response.bits) == (kwargs["count"] + 7) // 8 * 8
+        return getattr(response, "address", kwargs["address"]) == kwargs["address"]
+
+    def _capture(self, method: str, start: float, end: float, response, kwargs: dict):
+        if method.startswith("read_"):
+            request = kwargs["count"]
+        else:
+            request = kwargs["values"] if "values" in kwargs else kwargs["value"]
+
+        if response is None:
+            result = None
+        elif response.isError():
+            result = str(getattr(response, "exception_code", "?"))
+        elif method in ("read_coils", "read_discrete_inputs"):
+            result = [int(bit) for bit in response.bits[:request]]
+        elif method.startswith("read_"):
+            result = list(response.registers)
+        else:
+            result = True
+        self.capture.record(start, end, kwargs["device_id"], FUNCTION_CODES[method], kwargs["address"], request, result)
+
+    def start_capture(self) -> BusCapture:
+        """Start recording every transaction on the bus. There is one capture per bus at a time."""
+        if self.capture is not None:
+            raise RuntimeError(f"A capture is already running on bus {self.key}")
+        self.capture = BusCapture(str(self.key))
+        return self.capture
+
+    def stop_capture(self) -> BusCapture | None:
+        capture, self.capture = self.capture, None
+        return capture
+
+    def dump_trace(self) -> list[dict]:
+        """The recent transactions on the bus, oldest first. Times are time.monotonic() seconds."""
+        return [
+            {
+                "start": start,
+                "duration_ms": round((end - start) * 1000, 2),
+                "function_code": function_code,
+                "slave": slave,
+                "address": address,
+                "count": count,
+                "retries": retries,
+                "outcome": outcome,
+            }
+            for start, end, function_code, slave, address, count, retries, outcome in self.trace
+        ]
+
+    # Request and response sizes below are for RTU frames: address, function code,
+    # the data and a 2 byte CRC
+    async def read_input_registers(self, address: int, count: int, device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_POLL):
+        return await self._execute("read_input_registers", 8, 5 + 2 * count, response_delay, retries, priority, address=address, count=count, device_id=device_id)
+
+    async def read_holding_registers(self, address: int, count: int, device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_POLL):
+        return await self._execute("read_holding_registers", 8, 5 + 2 * count, response_delay, retries, priority, address=address, count=count, device_id=device_id)
+
+    async def read_coils(self, address: int, count: int, device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_POLL):
+        return await self._execute("read_coils", 8, 5 + (count + 7) // 8, response_delay, retries, priority, address=address, count=count, device_id=device_id)
+
+    async def read_discrete_inputs(self, address: int, count: int, device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_POLL):
+        return await self._execute("read_discrete_inputs", 8, 5 + (count + 7) // 8, response_delay, retries, priority, address=address, count=count, device_id=device_id)
+
+    async def write_coil(self, address: int, value: bool, device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_USER):
+        return await self._execute("write_coil", 8, 8, response_delay, retries, priority, address=address, value=value, device_id=device_id)
+
+    async def write_coils(self, address: int, values: list[bool], device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_USER):
+        return await self._execute("write_coils", 9 + (len(values) + 7) // 8, 8, response_delay, retries, priority, address=address, values=values, device_id=device_id)
+
+    async def write_register(self, address: int, value: int, device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_USER):
+        return await self._execute("write_register", 8, 8, response_delay, retries, priority, address=address, value=value, device_id=device_id)
+
+    async def write_registers(self, address: int, values: list[int], device_id: int, response_delay: float = 0, retries: int = 0, priority: int = PRIORITY_USER):
+        return await self._execute("write_registers", 9 + 2 * len(values), 8, response_delay, retries, priority, address=address, values=values, device_id=device_id)
+
+""" ******************************************************* """
+""" ***************** CONNECTION REGISTRY ***************** """
+""" ******************************************************* """
+_connections: Dict[tuple, ModbusConnection] = {}
+
+def get_connection(connection_params: ConnectionParams) -> ModbusConnection:
+    """Return the shared connection for the bus, creating it on first use."""
+    connection = _connections.get(connection_params.key)
+    if connection is None:
+        connection = ModbusConnection(connection_params)
+        _connections[connection.key] = connection
+    elif isinstance(connection_params, RTUConnectionParams) and connection_params.baud_rate != connection.params.baud_rate:
+        _LOGGER.warning(
+            "Serial port %s is already open at %s baud, ignoring requested %s baud",
+            connection_params.serial_port, connection.params.baud_rate, connection_params.baud_rate
+        )
+    elif isinstance(connection_params, TCPConnectionParams):
+        for attribute, label in (("framer", "framer"), ("max_in_flight", "requests in flight"), ("baud_rate", "gateway baud rate")):
+            requested, current = getattr(connection_params, attribute), getattr(connection.params, attribute)
+            if requested != current:
+                _LOGGER.warning(
+                    "Gateway %s:%s is already open with %s %s, ignoring requested %s",
+                    connection_params.ip, connection_params.port, label, current, requested
+                )
+
+    connection.users += 1
+    _LOGGER.debug("Bus %s now has %s user(s)", connection.key, connection.users)
+    return connection
+
+def release_connection(connection: ModbusConnection):
+    """Drop one reference to the connection, closing it when the last user is gone."""
+    connection.users -= 1
+    if connection.users <= 0:
+        _connections.pop(connection.key, None)
+        connection.close()
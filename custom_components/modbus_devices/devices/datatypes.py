@@ -1,7 +1,7 @@
 from collections import namedtuple
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 import uuid
 
 ###########################################
@@ -12,6 +12,7 @@ class ModbusData:
     deviceClass: str = None             # None | Load value from HA device class 
     category: str = None                # None | "config" | "diagnostic"
     icon: str = None                    # None | "mdi:thermometer"....
+    enabled: bool = True                # False | Entity is disabled until the user enables it
 
 @dataclass
 class ModbusSensorData(ModbusData):
@@ -46,19 +47,28 @@ class ModbusButtonData(ModbusData):
 ################################################
 class ModbusMode(Enum):
     NONE = 0        # Used for virtual data points
+    COIL = 1
+    DISCRETE_INPUT = 2
     INPUT = 3
     HOLDING = 4
 
+    @property
+    def is_bit(self) -> bool:
+        """True for modes that address single bits instead of registers."""
+        return self in (ModbusMode.COIL, ModbusMode.DISCRETE_INPUT)
+
 class ModbusPollMode(Enum):
     POLL_OFF = 0      # Values will not be read automatically
     POLL_ON = 1         # Values will be read each poll interval
     POLL_ONCE = 2       # Just read them once, for example for static configuration
 
 class ModbusGroup:
-    def __init__(self, mode, poll_mode):
+    def __init__(self, mode, poll_mode, poll_interval: float = None):
         # Initialize mode and poll_mode
         self.mode = mode
         self.poll_mode = poll_mode
+        # Seconds between polls of this group, None uses the device scan interval
+        self.poll_interval = poll_interval
         # Generate a unique ID automatically when the instance is created
         self._unique_id = str(uuid.uuid4())
 
@@ -79,6 +89,7 @@ class ModbusGroup:
 class ModbusDefaultGroups(Enum):
     CONFIG = ModbusGroup(ModbusMode.HOLDING, ModbusPollMode.POLL_OFF)
     UI = ModbusGroup(ModbusMode.NONE, ModbusPollMode.POLL_OFF)
+    DIAGNOSTICS = ModbusGroup(ModbusMode.NONE, ModbusPollMode.POLL_OFF)
 
     @property
     def unique_id(self):
@@ -92,6 +103,37 @@ class ModbusDefaultGroups(Enum):
     def poll_mode(self):
         return self.value.poll_mode  # Access the poll_mode property directly
 
+    @property
+    def poll_interval(self):
+        return self.value.poll_interval  # Access the poll_interval property directly
+
+class ModbusFormat(Enum):
+    UINT16 = "uint16"
+    INT16 = "int16"
+    UINT32 = "uint32"
+    INT32 = "int32"
+    UINT64 = "uint64"
+    INT64 = "int64"
+    FLOAT32 = "float32"
+    FLOAT64 = "float64"
+    STRING = "string"       # One character per register
+    ASCII = "ascii"         # Two characters per register
+
+    @property
+    def registers(self) -> Optional[int]:
+        """Number of registers for numeric formats, None for text."""
+        return FORMAT_REGISTERS.get(self)
+
+FORMAT_REGISTERS = {
+    ModbusFormat.UINT16: 1, ModbusFormat.INT16: 1,
+    ModbusFormat.UINT32: 2, ModbusFormat.INT32: 2, ModbusFormat.FLOAT32: 2,
+    ModbusFormat.UINT64: 4, ModbusFormat.INT64: 4, ModbusFormat.FLOAT64: 4,
+}
+
+class ModbusOrder(Enum):
+    BIG = 0         # Most significant byte / word first
+    LITTLE = 1      # Least significant byte / word first
+
 @dataclass
 class ModbusDatapoint:
     Address: int = 0                                   # 0-indexed address
@@ -99,4 +141,30 @@ class ModbusDatapoint:
     Scaling: float = 1                                  # Multiplier for raw value      
     Value: float = 0                                    # Scaled value
     Attrs: Optional[Dict] = None                        # Dict for attributes
-    DataType: ModbusData = None                         # Entitiy parameters
\ No newline at end of file
+    DataType: ModbusData = None                         # Entitiy parameters
+    Format: ModbusFormat = None                         # None | INT16, INT32 or STRING depending on Length
+    ByteOrder: ModbusOrder = ModbusOrder.BIG            # Order of the bytes within a register
+    WordOrder: ModbusOrder = ModbusOrder.BIG            # Order of the registers within a value
+    Bit: Optional[int] = None                           # None | First bit of a bit-field in the register
+    BitLength: int = 1                                  # Number of bits in the bit-field
+
+    def __post_init__(self):
+        # Numeric formats decide the number of registers themselves
+        if self.Format is not None and self.Format.registers is not None:
+            self.Length = self.Format.registers
+
+        # Bit-fields are always taken from a single register
+        if self.Bit is not None:
+            if self.Bit < 0 or self.BitLength < 1 or self.Bit + self.BitLength > 16:
+                raise ValueError(f"Bit-field {self.Bit}+{self.BitLength} does not fit in one register")
+            self.Length = 1
+
+@dataclass
+class ModbusWatch:
+    Triggers: List[Tuple[ModbusGroup, str]]             # Writes to these datapoints start the watch
+    Datapoints: List[Tuple[ModbusGroup, str]]           # Datapoints polled quickly until settled
+    Actual: Optional[Tuple[ModbusGroup, str]] = None    # None | Settled when this datapoint...
+    Target: Optional[Tuple[ModbusGroup, str]] = None    # ...is within Tolerance of this one
+    Tolerance: float = 0
+    StableSamples: int = 3                              # Or when no watched value changed for this many polls
+    Timeout: float = 60                                 # Or after this many seconds
@@ -1,48 +1,114 @@
+import ast
 import asyncio
 import logging
 import os
+import threading
 
+from dataclasses import dataclass
 from importlib import import_module
 
 _LOGGER = logging.getLogger(__name__)
 
-async def get_available_drivers():
-    # Get the base path to the "devices" folder
-    base_path = os.path.dirname(os.path.abspath(__file__))  # Path to "devices/helpers.py"
+# Path to the "devices" folder, drivers are in one folder per manufacturer below it
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 
-    # Offload the blocking os.walk() operation to a separate thread
-    return await asyncio.to_thread(scan_drivers, base_path)
+@dataclass(frozen=True)
+class DriverInfo:
+    """A driver as found on disk, read without importing it."""
+    driver: str                     # Module path relative to "devices", e.g. "Trox.TVE"
+    manufacturer: str | None = None
+    model: str | None = None
 
-def scan_drivers(base_path):
-    drivers = []
-    for root, _, files in os.walk(base_path):
+    @property
+    def label(self) -> str:
+        if self.manufacturer and self.model:
+            return f"{self.manufacturer} {self.model}"
+        return self.driver
+
+# The index is built once per process, and again only when a driver folder changes
+_index: dict[str, DriverInfo] = {}
+_index_signature = None
+_index_lock = threading.Lock()
+
+# Each driver is imported at most once
+_device_classes: dict[str, type] = {}
+
+async def get_driver_infos() -> list[DriverInfo]:
+    # Offload the blocking file system calls to a separate thread
+    return list((await asyncio.to_thread(get_driver_index)).values())
+
+def get_driver_index(base_path: str = BASE_PATH) -> dict[str, DriverInfo]:
+    """All drivers by name. Blocking, but only scans and parses them when a driver folder has changed."""
+    global _index, _index_signature
+    with _index_lock:
+        signature = _folder_signature(base_path)
+        if signature != _index_signature:
+            _index = scan_drivers(base_path)
+            _index_signature = signature
+            _LOGGER.debug("Indexed %s drivers", len(_index))
+        return _index
+
+def _folder_signature(base_path: str) -> tuple:
+    """Modification times of "devices/" and its subfolders, which change when a driver is added or removed."""
+    with os.scandir(base_path) as entries:
+        folders = sorted((entry.name, entry.stat().st_mtime_ns) for entry in entries if entry.is_dir() and entry.name != "__pycache__")
+    return (os.stat(base_path).st_mtime_ns, tuple(folders))
+
+def scan_drivers(base_path: str) -> dict[str, DriverInfo]:
+    drivers = {}
+    for root, dirs, files in os.walk(base_path):
+        dirs[:] = [folder for folder in dirs if folder != "__pycache__"]
         if root == base_path:  # Skip files in the "devices/" root directory
             continue
         for file in files:
             if file.endswith(".py") and file != "__init__.py":
                 # Create the module path relative to the "devices/" folder
                 relative_path = os.path.relpath(os.path.join(root, file), base_path)
-                driver_path = relative_path.replace(os.sep, ".").rstrip(".py")
-                drivers.append(driver_path)
+                driver = relative_path[:-len(".py")].replace(os.sep, ".")
+                drivers[driver] = read_driver_info(driver, os.path.join(root, file))
     return drivers
 
+def read_driver_info(driver: str, path: str) -> DriverInfo:
+    """Read manufacturer and model from the Device class of a driver, without running any of it."""
+    try:
+        with open(path, encoding="utf-8") as file:
+            tree = ast.parse(file.read(), path)
+    except (OSError, SyntaxError, ValueError) as e:
+        _LOGGER.debug(f"Error: {e} while reading driver {driver}")
+        return DriverInfo(driver)
+
+    attributes = {}
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "Device":
+            for statement in node.body:
+                if isinstance(statement, ast.Assign) and isinstance(statement.value, ast.Constant):
+                    for target in statement.targets:
+                        if isinstance(target, ast.Name) and target.id in ("manufacturer", "model"):
+                            attributes[target.id] = statement.value.value
+    return DriverInfo(driver, attributes.get("manufacturer"), attributes.get("model"))
+
 async def load_device_class(driver_name):
+    # Drivers are only imported once per process
+    device_class = _device_classes.get(driver_name)
+    if device_class is not None:
+        return device_class
+
     # Define the base package path
     base_package = "custom_components.modbus_devices"  # Your custom integration package path
-    
+
     # Create the module path (e.g., "devices.Trox.TVE")
     module_path = f".devices.{driver_name}"
 
     try:
         # Dynamically import the module
-        #driver_module = importlib.import_module(module_path, package=base_package)
         driver_module = await asyncio.to_thread(import_module, module_path, base_package)
 
         # Load tye class named 'Device' in the module
         device_class = getattr(driver_module, 'Device')
-        
+        _device_classes[driver_name] = device_class
+
         return device_class
-        
+
     except AttributeError as e:
         # If the 'Device' class is not found in the module, print the error
         _LOGGER.debug(f"AttributeError: {e} - Class 'Device' not found in {module_path}")
@@ -54,4 +120,4 @@ async def load_device_class(driver_name):
     except Exception as e:
         # Handle any other exceptions that may arise
         _LOGGER.debug(f"Error: {e} while loading module {module_path}")
-        return None
\ No newline at end of file
+        return None
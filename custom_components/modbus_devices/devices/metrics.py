@@ -0,0 +1,92 @@
+import math
+import time
+
+from collections import deque
+from typing import Dict
+
+# Latency percentiles are taken over the most recent samples
+METRICS_SAMPLES = 100
+
+# Seconds over which bus utilization is averaged
+UTILIZATION_WINDOW = 300
+
+class LatencyStats():
+    """Recent latencies in seconds, cheap to add to and summarized on demand."""
+    def __init__(self):
+        self._samples = deque(maxlen=METRICS_SAMPLES)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        """Nearest-rank percentile of the recent samples, None if there are none."""
+        if not self._samples:
+            return None
+        samples = sorted(self._samples)
+        return samples[max(math.ceil(percent / 100 * len(samples)) - 1, 0)]
+
+    @property
+    def max(self) -> float | None:
+        return max(self._samples, default=None)
+
+class TransactionStats():
+    """Counters for the transactions of a device, a group or a whole bus."""
+    def __init__(self):
+        self.transactions = 0
+        self.bytes = 0              # Request and response frames, as RTU
+        self.retries = 0
+        self.timeouts = 0           # Transactions that never got a response
+        self.errors = 0             # Transactions that failed, timeouts included
+        self.latency = LatencyStats()
+
+    def record(self, seconds: float, chars: int, retries: int = 0, timed_out: bool = False, failed: bool = False):
+        self.transactions += 1
+        self.bytes += chars
+        self.retries += retries
+        self.timeouts += timed_out
+        self.errors += failed
+        self.latency.add(seconds)
+
+    def record_error(self):
+        """Count a request that failed before anything was sent, like while the bus is down."""
+        self.errors += 1
+
+class BusMetrics(TransactionStats):
+    """Transactions on one bus, in total and per device, and how busy the bus is."""
+    def __init__(self):
+        super().__init__()
+        self.devices: Dict[int, TransactionStats] = {}
+        self._started = time.monotonic()
+        self._busy = deque()        # (end, duration) of recent transactions
+
+    def record_transaction(self, device_id: int, start: float, end: float, chars: int, retries: int, timed_out: bool, failed: bool):
+        """Record one transaction, start and end in time.monotonic() seconds."""
+        self.record(end - start, chars, retries, timed_out, failed)
+        self.devices.setdefault(device_id, TransactionStats()).record(end - start, chars, retries, timed_out, failed)
+
+        self._busy.append((end, end - start))
+        while self._busy[0][0] < end - UTILIZATION_WINDOW:
+            self._busy.popleft()
+
+    def record_unsent(self, device_id: int):
+        """Record a request that failed before it was sent. It used no bus time and moved no bytes."""
+        self.record_error()
+        self.devices.setdefault(device_id, TransactionStats()).record_error()
+
+    def utilization(self) -> float:
+        """Percentage of the recent past that the bus spent on transactions."""
+        now = time.monotonic()
+        window = min(UTILIZATION_WINDOW, now - self._started)
+        if window <= 0:
+            return 0
+        busy = sum(duration for end, duration in self._busy if end >= now - window)
+        return min(100 * busy / window, 100)
+
+class DeviceMetrics():
+    """Latency of full polls, and transactions per group, for one device."""
+    def __init__(self):
+        self.poll = LatencyStats()
+        self.groups: Dict[object, TransactionStats] = {}
+
+    def group(self, group) -> TransactionStats:
+        return self.groups.setdefault(group, TransactionStats())
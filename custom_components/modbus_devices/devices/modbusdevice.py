@@ -1,20 +1,33 @@
+import asyncio
 import logging
+import time
 
 from typing import Dict
 
+from homeassistant.const import PERCENTAGE, UnitOfInformation, UnitOfTime
 from homeassistant.helpers.entity import EntityCategory
 
-from pymodbus.client import AsyncModbusTcpClient, AsyncModbusSerialClient
-from pymodbus.framer import FramerType
-from pymodbus.exceptions import ModbusException
+from pymodbus.exceptions import ConnectionException, ModbusException
 
-from .connection import ConnectionParams, TCPConnectionParams, RTUConnectionParams
+from .connection import ConnectionParams, PRIORITY_POLL, PRIORITY_USER, get_connection, release_connection
 
 from .datatypes import ModbusMode, ModbusPollMode, ModbusDefaultGroups, ModbusGroup, ModbusDatapoint
-from .datatypes import ModbusSelectData, ModbusNumberData
+from .datatypes import ModbusSelectData, ModbusNumberData, ModbusSensorData, ModbusWatch
+from .metrics import DeviceMetrics
+from .codec import ModbusCodec
+from .planner import ModbusReadBlock, DEFAULT_MAX_READ_GAP, max_gap_for_link, plan_reads
 
 _LOGGER = logging.getLogger(__name__)
 
+MAX_REGISTERS_PER_WRITE = 123
+MAX_COILS_PER_WRITE = 1968
+
+# Modbus exception code for registers the device doesn't have
+ILLEGAL_DATA_ADDRESS = 2
+
+class ModbusIllegalAddress(ModbusException):
+    """The device answered that some of the registers read don't exist."""
+
 class ModbusDevice():
     # Default properties
     manufacturer = None
@@ -22,21 +35,59 @@ class ModbusDevice():
     sw_version = None
     serial_number = None
 
+    # Unused registers a merged read may span to save a transaction.
+    # None derives it from the baud rate and response delay.
+    max_read_gap = None
+
+    # Time the device needs before it starts responding, in seconds
+    response_delay = 0.01
+
+    # Times a request is repeated when no response arrives in time
+    retries = 2
+
+    # Seconds of bus silence before a keepalive read is sent, None disables it
+    keepalive_interval = None
+
+    # Groups whose values change as a result of writing to a group, read back
+    # together with the written datapoints, e.g. {GROUP_COMMANDS: [GROUP_STATUS]}
+    write_dependencies: Dict[ModbusGroup, list[ModbusGroup]] = {}
+
+    # Datapoints to poll quickly after a write, until the device has settled
+    watches: list[ModbusWatch] = []
+
     def __init__(self, connection_params: ConnectionParams):
-        if isinstance(connection_params, TCPConnectionParams):
-            self._client = AsyncModbusTcpClient(host=connection_params.ip, port=connection_params.port, framer=FramerType.RTU)
-        elif isinstance(connection_params, RTUConnectionParams):
-            self._client = AsyncModbusSerialClient(port=connection_params.serial_port, baudrate=connection_params.baud_rate)
-        else:
-            raise ValueError("Unsupported connection parameters")
         self._slave_id = connection_params.slave_id
 
         self.Datapoints: Dict[ModbusGroup, Dict[str, ModbusDatapoint]] = {}
         self.loadDatapoints()
         self.loadConfigUI()
+        self.loadDiagnostics()
         _LOGGER.debug("Loaded datapoints for %s %s", self.manufacturer, self.model)
 
+        # Devices on the same serial port / gateway share one client
+        self._client = get_connection(connection_params)
+        if self.keepalive_interval is not None:
+            self._client.add_keepalive(self.keepalive_interval, self.probe)
+
+        if self.max_read_gap is not None:
+            self._maxReadGap = self.max_read_gap
+        elif connection_params.baud_rate:
+            self._maxReadGap = max_gap_for_link(connection_params.baud_rate, self.response_delay)
+        else:
+            self._maxReadGap = DEFAULT_MAX_READ_GAP
+        _LOGGER.debug("Reads may skip up to %s unused registers", self._maxReadGap)
+
+        self.metrics = DeviceMetrics()
+
         self.firstRead = True
+        self._readPlans: Dict[frozenset, list[ModbusReadBlock]] = {}
+
+    def close(self):
+        if self._client is not None:
+            if self.keepalive_interval is not None:
+                self._client.remove_keepalive(self.probe)
+            release_connection(self._client)
+            self._client = None
 
     def loadConfigUI(self):
         # Ensure default groups exist
@@ -50,6 +101,23 @@ class ModbusDevice():
                 "Config Value": ModbusDatapoint(DataType=ModbusNumberData(category=EntityCategory.CONFIG, min_value=0, max_value=65535, step=1))
             }
 
+    def loadDiagnostics(self):
+        # Performance metrics, disabled until the user enables them
+        def diagnostic(units=None):
+            return ModbusDatapoint(Value=None, DataType=ModbusSensorData(category=EntityCategory.DIAGNOSTIC, units=units, enabled=False))
+
+        self.Datapoints[ModbusDefaultGroups.DIAGNOSTICS] = {
+            "Poll Latency p50": diagnostic(UnitOfTime.MILLISECONDS),
+            "Poll Latency p95": diagnostic(UnitOfTime.MILLISECONDS),
+            "Poll Latency Max": diagnostic(UnitOfTime.MILLISECONDS),
+            "Transactions": diagnostic(),
+            "Bytes Transferred": diagnostic(UnitOfInformation.BYTES),
+            "Retries": diagnostic(),
+            "Timeouts": diagnostic(),
+            "Errors": diagnostic(),
+            "Bus Utilization": diagnostic(PERCENTAGE),
+        }
+
     def loadDatapoints(self):
         pass
 
@@ -66,70 +134,232 @@ class ModbusDevice():
     """ ******************************************************* """
     """ *********** EXTERNAL CALL TO READ ALL DATA ************ """
     """ ******************************************************* """
-    async def readData(self):
+    async def readData(self, groups: list[ModbusGroup] = None, priority: int = PRIORITY_POLL) -> set[tuple[ModbusGroup, str]]:
+        """Read the given POLL_ON groups, or all of them if None.
+
+        Returns the (group, key) of every datapoint whose value or attributes
+        changed, including values calculated in onAfterRead.
+        """
         if self.firstRead:      
             await self._client.connect() 
 
+        start = time.monotonic()
+        before = self._snapshot()
         self.onBeforeRead()
 
-        try:
-            for group, _ in self.Datapoints.items():
-                if group.poll_mode == ModbusPollMode.POLL_ON:
-                    await self.readGroup(group)
-                elif group.poll_mode == ModbusPollMode.POLL_ONCE and self.firstRead:
-                    await self.readGroup(group)
-        except Exception as err:
-            raise
+        if groups is None:
+            groups = [group for group in self.Datapoints if group.poll_mode == ModbusPollMode.POLL_ON]
+        if self.firstRead:
+            groups = groups + [group for group in self.Datapoints if group.poll_mode == ModbusPollMode.POLL_ONCE]
+
+        plan = self.getReadPlan(groups)
+        if self._client.max_in_flight > 1:
+            # The connection limits how many of these are actually in flight
+            await asyncio.gather(*(self.readBlock(block, priority) for block in plan))
+        else:
+            for block in plan:
+                await self.readBlock(block, priority)
 
         if self.firstRead:   
             self.firstRead = False
             self.onAfterFirstRead()
+            # Drivers may add groups on first read, so plan again
+            self._readPlans.clear()
+
+        self.onAfterRead()
+
+        self.metrics.poll.add(time.monotonic() - start)
+        self.updateMetrics()
+
+        after = self._snapshot()
+        return {dp_key for dp_key, state in after.items() if before.get(dp_key) != state}
+
+    def updateMetrics(self):
+        """Copy the metrics of the device and its groups into the diagnostic datapoints."""
+        metrics = self.Datapoints[ModbusDefaultGroups.DIAGNOSTICS]
+        device = self._client.metrics.devices.get(self._slave_id)
+        if device is None:
+            return
+
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 1)
+
+        groups = {self._groupLabel(group): stats for group, stats in self.metrics.groups.items()}
+        metrics["Poll Latency p50"].Value = ms(self.metrics.poll.percentile(50))
+        metrics["Poll Latency p95"].Value = ms(self.metrics.poll.percentile(95))
+        metrics["Poll Latency p95"].Attrs = {label: ms(stats.latency.percentile(95)) for label, stats in groups.items()}
+        metrics["Poll Latency Max"].Value = ms(self.metrics.poll.max)
+        metrics["Poll Latency Max"].Attrs = {label: ms(stats.latency.max) for label, stats in groups.items()}
+        metrics["Transactions"].Value = device.transactions
+        metrics["Transactions"].Attrs = {label: stats.transactions for label, stats in groups.items()}
+        metrics["Bytes Transferred"].Value = device.bytes
+        metrics["Retries"].Value = device.retries
+        metrics["Timeouts"].Value = device.timeouts
+        metrics["Errors"].Value = device.errors
+        metrics["Errors"].Attrs = {label: stats.errors for label, stats in groups.items()}
+        metrics["Bus Utilization"].Value = round(self._client.metrics.utilization(), 1)
+
+    def getTrace(self) -> list[dict]:
+        """Recent transactions on the bus, from every device on it."""
+        return self._client.dump_trace() if self._client is not None else []
+
+    def startCapture(self):
+        """Record every transaction on the bus, from every device on it, until stopCapture."""
+        return self._client.start_capture()
+
+    def stopCapture(self):
+        return self._client.stop_capture()
+
+    def _groupLabel(self, group: ModbusGroup) -> str:
+        """Groups have no names, so they are labelled by mode and first address."""
+        addresses = [dp.Address for dp in self.Datapoints.get(group, {}).values()]
+        return f"{group.mode.name.title()} {min(addresses, default=0)}"
+
+    async def probe(self):
+        """Read a single register, to check whether the device responds at all."""
+        for group, datapoints in self.Datapoints.items():
+            if group.poll_mode == ModbusPollMode.POLL_OFF or group.mode == ModbusMode.NONE:
+                continue
+            for datapoint in datapoints.values():
+                await self._read(group.mode, datapoint.Address, 1)
+                return
+
+    def _snapshot(self) -> dict:
+        return {
+            (group, key): (dp.Value, dp.Attrs)
+            for group, datapoints in self.Datapoints.items()
+            for key, dp in datapoints.items()
+        }
+
+    def getReadPlan(self, groups: list[ModbusGroup]) -> list[ModbusReadBlock]:
+        """Return the (cached) block reads covering the given groups."""
+        key = frozenset(groups)
+        plan = self._readPlans.get(key)
+        if plan is None:
+            plan = plan_reads(groups, self.Datapoints, self._maxReadGap)
+            self._readPlans[key] = plan
+        return plan
+
+    def getDatapointPlan(self, keys: frozenset[tuple[ModbusGroup, str]]) -> list[ModbusReadBlock]:
+        """Return the (cached) block reads covering just the given datapoints."""
+        plan = self._readPlans.get(keys)
+        if plan is None:
+            datapoints: Dict[ModbusGroup, Dict[str, ModbusDatapoint]] = {}
+            for group, key in keys:
+                datapoints.setdefault(group, {})[key] = self.Datapoints[group][key]
+            plan = plan_reads(datapoints, datapoints, self._maxReadGap)
+            self._readPlans[keys] = plan
+        return plan
 
+    """ ******************************************************* """
+    """ ****************** READ BACK WRITES ******************* """
+    """ ******************************************************* """
+    async def readBack(self, written: list[tuple[ModbusGroup, str]]) -> set[tuple[ModbusGroup, str]]:
+        """Read the written datapoints and the groups that depend on them.
+
+        Only polled datapoints are read back, since write-only commands often
+        can't be read. Returns the (group, key) of every datapoint that changed.
+        """
+        keys = [(group, key) for group, key in written if group.poll_mode != ModbusPollMode.POLL_OFF]
+        for group, _ in written:
+            for dependent in self.write_dependencies.get(group, []):
+                keys.extend((dependent, key) for key in self.Datapoints.get(dependent, {}))
+        return await self.readDatapoints(keys, PRIORITY_USER)
+
+    async def readDatapoints(self, keys: list[tuple[ModbusGroup, str]], priority: int = PRIORITY_POLL) -> set[tuple[ModbusGroup, str]]:
+        """Read just the given datapoints, merged into as few reads as possible.
+
+        Returns the (group, key) of every datapoint that changed.
+        """
+        readable = frozenset(
+            (group, key) for group, key in keys
+            if group.mode != ModbusMode.NONE and key in self.Datapoints.get(group, {})
+        )
+        if not readable:
+            return set()
+
+        before = self._snapshot()
+        for block in self.getDatapointPlan(readable):
+            await self.readBlock(block, priority)
         self.onAfterRead()
 
+        after = self._snapshot()
+        return {dp_key for dp_key, state in after.items() if before.get(dp_key) != state}
+
     """ ******************************************************* """
     """ ******************** READ GROUP *********************** """
     """ ******************************************************* """
     async def readGroup(self, group: ModbusGroup):
         """Read Modbus group registers and update data points."""
-        MAX_REGISTERS_PER_READ = 125
-
-        addresses = [
-            (dp.Address, dp.Length)
-            for dp in self.Datapoints[group].values()
-        ]
-        start_addr = min(addr for addr, _ in addresses)
-        end_addr = max(addr + length for addr, length in addresses)
-        n_reg = end_addr - start_addr
-
-        if n_reg > MAX_REGISTERS_PER_READ:
-            raise ValueError(
-                f"Too many registers to read at once ({n_reg} requested, max {MAX_REGISTERS_PER_READ}) "
-                f"for group {group}. Consider splitting the group."
-        )
+        for block in self.getReadPlan([group]):
+            await self.readBlock(block)
 
-        # Read the appropriate type of registers
+    async def readBlock(self, block: ModbusReadBlock, priority: int = PRIORITY_POLL):
+        """Read one block of registers and scatter it into the datapoints it covers."""
+        start = time.monotonic()
         try:
-            if group.mode == ModbusMode.INPUT:
-                response = await self._client.read_input_registers(address=start_addr, count=n_reg, device_id=self._slave_id)
-            elif group.mode == ModbusMode.HOLDING:
-                response = await self._client.read_holding_registers(address=start_addr, count=n_reg, device_id=self._slave_id)
-            else:
-                raise ValueError(f"Unsupported Modbus mode: {group.mode}")
-        except Exception as err:
+            data = await self._read(block.mode, block.address, block.count, priority)
+        except ModbusIllegalAddress:
+            self._recordBlock(block, start, failed=True)
+            parts = self._splitBlock(block)
+            if len(parts) == 1:
+                raise
+            # Some devices refuse reads that span unmapped registers. Stop merging across
+            # gaps for this device, and read what this block covers span by span.
+            _LOGGER.info("%s %s rejected a read across unused registers, reading them separately", self.manufacturer, self.model)
+            self._maxReadGap = 0
+            self._readPlans.clear()
+            for part in parts:
+                await self.readBlock(part, priority)
+            return
+        except ConnectionException:
+            # The bus is down and nothing was sent, so only the error counts
+            for group in {group for group, _, _ in block.datapoints}:
+                self.metrics.group(group).record_error()
             raise
+        except Exception:
+            self._recordBlock(block, start, failed=True)
+            raise
+        self._recordBlock(block, start)
+        _LOGGER.debug("Read data from address: %s - %s", block.address, data)
+
+        # Process the registers and update data points
+        block.decoder.decode(data)
+
+    def _splitBlock(self, block: ModbusReadBlock) -> list[ModbusReadBlock]:
+        """The reads covering the datapoints of a block, without skipping any unused registers."""
+        datapoints: Dict[ModbusGroup, Dict[str, ModbusDatapoint]] = {}
+        for group, key, dp in block.datapoints:
+            datapoints.setdefault(group, {})[key] = dp
+        return plan_reads(datapoints, datapoints, 0)
+
+    def _recordBlock(self, block: ModbusReadBlock, start: float, failed: bool = False):
+        seconds = time.monotonic() - start
+        chars = 13 + ((block.count + 7) // 8 if block.mode.is_bit else 2 * block.count)
+        for group in {group for group, _, _ in block.datapoints}:
+            self.metrics.group(group).record(seconds, chars, failed=failed)
+
+    async def _read(self, mode: ModbusMode, address: int, count: int, priority: int = PRIORITY_POLL) -> list[int] | list[bool]:
+        """Read registers, or bits for coils and discrete inputs."""
+        if mode == ModbusMode.INPUT:
+            response = await self._client.read_input_registers(address=address, count=count, device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+        elif mode == ModbusMode.HOLDING:
+            response = await self._client.read_holding_registers(address=address, count=count, device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+        elif mode == ModbusMode.COIL:
+            response = await self._client.read_coils(address=address, count=count, device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+        elif mode == ModbusMode.DISCRETE_INPUT:
+            response = await self._client.read_discrete_inputs(address=address, count=count, device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+        else:
+            raise ValueError(f"Unsupported Modbus mode: {mode}")
 
         # Handle Modbus errors
         if response.isError():
-            raise ModbusException(f"Error reading group {group}: {response}")
-
-        _LOGGER.debug("Read data from address: %s - %s", start_addr, response.registers)
+            if getattr(response, "exception_code", None) == ILLEGAL_DATA_ADDRESS:
+                raise ModbusIllegalAddress(f"Error reading {count} {mode.name} from address {address}: {response}")
+            raise ModbusException(f"Error reading {count} {mode.name} from address {address}: {response}")
 
-        # Process the registers and update data points
-        for name, dp in self.Datapoints[group].items():
-            offset = dp.Address - start_addr
-            registers = response.registers[offset:offset + dp.Length]
-            dp.Value = self.process_registers(registers, dp.Scaling)
+        # Bits are padded to whole bytes
+        return response.bits[:count] if mode.is_bit else response.registers
 
     """ ******************************************************* """
     """ **************** READ SINGLE VALUE ******************** """
@@ -141,25 +371,13 @@ class ModbusDevice():
             raise KeyError(f"Key '{key}' not found in group '{group}'")
 
         datapoint = self.Datapoints[group][key]
-        length = datapoint.Length
-
-        try:
-            if group.mode == ModbusMode.INPUT:
-                response = await self._client.read_input_registers(address=datapoint.Address, count=length, device_id=self._slave_id)
-            elif group.mode == ModbusMode.HOLDING:
-                response = await self._client.read_holding_registers(address=datapoint.Address, count=length, device_id=self._slave_id)
-            else:
-                raise ValueError(f"Unsupported Modbus mode: {group.mode}")
-        except Exception as err:
-            raise
-
-        _LOGGER.debug("Read data: %s", response.registers)
-
-        if response.isError():
-            raise ModbusException(f"Error reading value for key '{key}': {response}")
+        data = await self._read(group.mode, datapoint.Address, datapoint.Length, PRIORITY_USER)
+        _LOGGER.debug("Read data: %s", data)
 
-        registers = response.registers[:length]
-        datapoint.Value = self.process_registers(registers, datapoint.Scaling)
+        if group.mode.is_bit:
+            datapoint.Value = int(data[0])
+        else:
+            datapoint.Value = ModbusCodec(datapoint).decode(data)
 
         return datapoint.Value
 
@@ -173,66 +391,97 @@ class ModbusDevice():
             raise KeyError(f"Key '{key}' not found in group '{group}'")
 
         datapoint = self.Datapoints[group][key]
-        length = datapoint.Length
-        if length > 2:
-            raise ValueError(f"Unsupported register length: {length}. Only 1 or 2 registers are supported.")
-
-        # Scale the value
-        scaled_value = round(value / datapoint.Scaling)
-        if scaled_value < 0:
-            scaled_value = self.twos_complement(scaled_value, bits=16 * length)
-
-        # Prepare the registers
-        registers = []
-        for _ in range(length):
-            registers.insert(0, scaled_value & 0xFFFF)  # Extract the least significant 16 bits
-            scaled_value >>= 16  # Shift the value to the next 16 bits
-
-        # Write the registers
-        try:
-            if length == 1:
-                response = await self._client.write_register(address=datapoint.Address, value=registers[0], device_id=self._slave_id)
-            else:
-                response = await self._client.write_registers(address=datapoint.Address, values=registers, device_id=self._slave_id)
-        except Exception as err:
-            raise
 
-        if response.isError():
-            raise ModbusException(f"Failed to write value for key '{key}': {response}")
+        # Bit-fields must keep the other bits of the register
+        current = None
+        if datapoint.Bit is not None and group.mode == ModbusMode.HOLDING:
+            current = (await self._read(group.mode, datapoint.Address, 1, PRIORITY_USER))[0]
+
+        await self._write(group.mode, datapoint.Address, self._encode(group, datapoint, value, current))
 
         # Update the cached value
         datapoint.Value = value
         _LOGGER.debug("Successfully wrote value for key '%s': %s", key, value)
 
     """ ******************************************************* """
-    """ *********** HELPER FOR PROCESSING REGISTERS *********** """
+    """ *************** WRITE MULTIPLE VALUES ***************** """
     """ ******************************************************* """
-    def twos_complement(self, number: int, bits: int = 16) -> int:
-        if number < 0:
-            return number  # If the number is negative, no need for two's complement conversion.
-        
-        max_value = (1 << bits)  # Maximum value for the given bit-width.
-        if number >= max_value // 2:
-            return number - max_value  # Convert to negative value in two's complement.
-        
-        return number  # Return the number as is if it's already non-negative.
-
-    def process_registers(self, registers: list[int], scaling: float) -> float | str:
-        length = len(registers)
-
-        if length <= 2:
-            # Combine registers into a single value (big-endian)
-            combined_value = 0
-            for reg in registers:
-                combined_value = (combined_value << 16) | reg
-
-            newVal = self.twos_complement(combined_value)
-            return newVal if scaling == 1.0 else newVal * scaling
-        else:
-            # Assume this is a text string
+    async def writeValues(self, writes: list[tuple[ModbusGroup, str, float]]) -> list[Exception | None]:
+        """Write several values, merging contiguous addresses into single transactions.
+
+        Returns an exception, or None on success, for each write.
+        """
+        results = [None] * len(writes)
+
+        # Runs of contiguous addresses: [mode, address, data, indexes]
+        runs = []
+        order = sorted(range(len(writes)), key=lambda i: (writes[i][0].mode.value, self._writeAddress(writes[i])))
+        for i in order:
+            group, key, value = writes[i]
+            try:
+                if key not in self.Datapoints.get(group, {}):
+                    raise KeyError(f"Key '{key}' not found in group '{group}'")
+                datapoint = self.Datapoints[group][key]
+
+                # Bit-fields need a read first, so they are written on their own
+                if datapoint.Bit is not None:
+                    await self.writeValue(group, key, value)
+                    continue
+                data = self._encode(group, datapoint, value)
+            except Exception as err:
+                results[i] = err
+                continue
+
+            max_length = MAX_COILS_PER_WRITE if group.mode == ModbusMode.COIL else MAX_REGISTERS_PER_WRITE
+            if runs:
+                mode, address, run_data, indexes = runs[-1]
+                if mode == group.mode and address + len(run_data) == datapoint.Address and len(run_data) + len(data) <= max_length:
+                    run_data.extend(data)
+                    indexes.append(i)
+                    continue
+            runs.append([group.mode, datapoint.Address, list(data), [i]])
+
+        for mode, address, data, indexes in runs:
+            _LOGGER.debug("Writing %s value(s) from address %s", len(indexes), address)
             try:
-                newVal = ''.join(chr(value) for value in registers)
-                return newVal.rstrip('\x00')
-            except ValueError as e:
-                # Failed to decode text, most likely just registers we are ignoring
-                return registers
\ No newline at end of file
+                await self._write(mode, address, data)
+            except Exception as err:
+                for i in indexes:
+                    results[i] = err
+                continue
+
+            # Update the cached values
+            for i in indexes:
+                group, key, value = writes[i]
+                self.Datapoints[group][key].Value = value
+
+        return results
+
+    def _writeAddress(self, write) -> int:
+        # Only sorts the writes, an unknown datapoint is reported in its own result
+        group, key, _ = write
+        datapoint = self.Datapoints.get(group, {}).get(key)
+        return datapoint.Address if datapoint is not None else -1
+
+    def _encode(self, group: ModbusGroup, datapoint: ModbusDatapoint, value: float, current: int = None) -> list[int] | list[bool]:
+        if group.mode == ModbusMode.COIL:
+            return [bool(value)]
+        if group.mode == ModbusMode.HOLDING:
+            return ModbusCodec(datapoint).encode(value, current)
+        raise ValueError(f"Can't write to {group.mode.name} datapoint at address {datapoint.Address}")
+
+    async def _write(self, mode: ModbusMode, address: int, data: list[int] | list[bool], priority: int = PRIORITY_USER):
+        """Write registers, or coils, using the single write when possible."""
+        if mode == ModbusMode.COIL:
+            if len(data) == 1:
+                response = await self._client.write_coil(address=address, value=data[0], device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+            else:
+                response = await self._client.write_coils(address=address, values=data, device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+        else:
+            if len(data) == 1:
+                response = await self._client.write_register(address=address, value=data[0], device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+            else:
+                response = await self._client.write_registers(address=address, values=data, device_id=self._slave_id, response_delay=self.response_delay, retries=self.retries, priority=priority)
+
+        if response.isError():
+            raise ModbusException(f"Failed to write {len(data)} {mode.name} to address {address}: {response}")
@@ -0,0 +1,92 @@
+import logging
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from .datatypes import ModbusMode, ModbusGroup, ModbusDatapoint
+from .codec import BlockDecoder, BitBlockDecoder
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_REGISTERS_PER_READ = 125
+MAX_BITS_PER_READ = 2000
+
+# Cost model for RTU links. A character is start + 8 data + stop bits, and a read
+# transaction carries a request frame (8), a response header and CRC (5) and a
+# 3.5 character silence before both frames, besides the register data itself.
+RTU_BITS_PER_CHAR = 10
+RTU_READ_OVERHEAD_CHARS = 8 + 5 + 2 * 3.5
+
+# Used when the link speed is unknown, e.g. behind a TCP gateway
+DEFAULT_MAX_READ_GAP = 10
+
+@dataclass
+class ModbusReadBlock:
+    mode: ModbusMode                                    # COIL | DISCRETE_INPUT | INPUT | HOLDING
+    address: int                                        # First register (or bit) in the read
+    count: int                                          # Number of registers (or bits) in the read
+    datapoints: List[Tuple[ModbusGroup, str, ModbusDatapoint]] = field(default_factory=list)
+    decoder: BlockDecoder | BitBlockDecoder = None      # Compiled once the block is complete
+
+def max_gap_for_link(baud_rate: int, response_delay: float) -> int:
+    """Unused registers that are cheaper to read than a separate transaction.
+
+    An extra transaction costs a request frame, a response header, two
+    inter-frame silences and the device response delay, while every register
+    read adds two characters to the response.
+    """
+    char_time = RTU_BITS_PER_CHAR / baud_rate
+    transaction_time = RTU_READ_OVERHEAD_CHARS * char_time + response_delay
+    return int(transaction_time / (2 * char_time))
+
+def plan_reads(groups: Iterable[ModbusGroup], datapoints: Dict[ModbusGroup, Dict[str, ModbusDatapoint]], max_gap: int = 0) -> List[ModbusReadBlock]:
+    """Cover the datapoints of the given groups with as few block reads as possible.
+
+    Datapoints of the same mode, also from different groups, are merged into one
+    read when the unused registers between them do not exceed max_gap and the
+    read stays within MAX_REGISTERS_PER_READ. A datapoint is never split between
+    two reads, and larger holes in the address space are skipped.
+
+    Coils and discrete inputs are packed eight to a byte, so up to
+    MAX_BITS_PER_READ can be read at once, and a register's worth of gap
+    equals 16 bits.
+    """
+    spans = []
+    for group in groups:
+        max_length = MAX_BITS_PER_READ if group.mode.is_bit else MAX_REGISTERS_PER_READ
+        for key, dp in datapoints.get(group, {}).items():
+            if dp.Length > max_length:
+                raise ValueError(
+                    f"Datapoint '{key}' is {dp.Length} long, "
+                    f"more than can be read at once (max {max_length})"
+                )
+            spans.append((group.mode, dp.Address, dp.Address + dp.Length, (group, key, dp)))
+
+    # Sorting by start address makes greedy merging optimal
+    spans.sort(key=lambda span: (span[0].value, span[1]))
+
+    blocks: List[ModbusReadBlock] = []
+    block = None
+    for mode, start, end, entry in spans:
+        if block is not None and block.mode == mode:
+            block_end = block.address + block.count
+            if mode.is_bit:
+                mode_gap, max_length = max_gap * 16, MAX_BITS_PER_READ
+            else:
+                mode_gap, max_length = max_gap, MAX_REGISTERS_PER_READ
+            if start - block_end <= mode_gap and max(end, block_end) - block.address <= max_length:
+                block.count = max(end, block_end) - block.address
+                block.datapoints.append(entry)
+                continue
+
+        block = ModbusReadBlock(mode=mode, address=start, count=end - start, datapoints=[entry])
+        blocks.append(block)
+
+    for block in blocks:
+        if block.mode.is_bit:
+            block.decoder = BitBlockDecoder(block.address, block.datapoints)
+        else:
+            block.decoder = BlockDecoder(block.address, block.count, block.datapoints)
+
+    _LOGGER.debug("Planned %s block read(s) for %s datapoint(s)", len(blocks), len(spans))
+    return blocks
@@ -0,0 +1,28 @@
+"""Diagnostics support for Modbus Devices."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_IP, CONF_PORT, CONF_SERIAL_PORT
+from .coordinator import ModbusCoordinator
+from .devices.datatypes import ModbusDefaultGroups
+
+# Where the device is on the network or on the host
+TO_REDACT = {CONF_IP, CONF_PORT, CONF_SERIAL_PORT}
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Return diagnostics for a config entry, with the recent transactions on its bus."""
+    coordinator: ModbusCoordinator = hass.data[DOMAIN][entry.entry_id]
+
+    metrics = {}
+    for key in coordinator._modbusDevice.Datapoints[ModbusDefaultGroups.DIAGNOSTICS]:
+        metrics[key] = {
+            "value": coordinator.get_value(ModbusDefaultGroups.DIAGNOSTICS, key),
+            "groups": coordinator.get_attrs(ModbusDefaultGroups.DIAGNOSTICS, key),
+        }
+
+    return {
+        "entry": async_redact_data(entry.data, TO_REDACT),
+        "metrics": metrics,
+        "trace": coordinator.get_trace(),
+    }
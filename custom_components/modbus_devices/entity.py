@@ -11,12 +11,13 @@ class ModbusBaseEntity(CoordinatorEntity):
     """Modbus base entity class."""
 
     def __init__(self, coordinator, group:ModbusGroup, key:str, modbusDataPoint:ModbusDatapoint):
-        """Pass coordinator to CoordinatorEntity."""
-        super().__init__(coordinator)
+        """Pass coordinator to CoordinatorEntity, only updates for this datapoint are received."""
+        super().__init__(coordinator, context=(group, key))
 
         """Generic Entity properties"""
         self._attr_entity_category = modbusDataPoint.DataType.category
         self._attr_icon = modbusDataPoint.DataType.icon
+        self._attr_entity_registry_enabled_default = modbusDataPoint.DataType.enabled
         self._attr_name = "{} {}".format(self.coordinator.devicename, key)
         self._attr_unique_id = "{}-{}".format(self.coordinator.device_id, self.name)
         self._attr_device_info = {
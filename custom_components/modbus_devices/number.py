@@ -75,7 +75,7 @@ class ModbusNumberEntity(ModbusBaseEntity, NumberEntity):
     async def async_set_native_value(self, value):
         """ Write value to device """
         try:
-            await self.coordinator.write_value(self._group, self._key, value)
+            await self.coordinator.write_value(self._group, self._key, value, debounce=True)
         except Exception as err:
             _LOGGER.debug("Error writing command: %s %s", self._group, self._key)
         finally:
@@ -74,7 +74,7 @@ class ModbusSelectEntity(ModbusBaseEntity, SelectEntity):
                 await self.coordinator.config_select(option, value)
             else:           
                 _LOGGER.debug("Writing")
-                await self.coordinator.write_value(self._group, self._key, value)
+                await self.coordinator.write_value(self._group, self._key, value, debounce=True)
         except Exception as err:
             _LOGGER.debug("Error writing command: %s %s", self._group, self._key)
         finally:
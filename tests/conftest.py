@@ -0,0 +1,12 @@
+"""Make the device layer importable on its own.
+
+Everything under devices/ is plain Python, so its tests import it as the top
+level "devices" package and run without Home Assistant. The folder is appended,
+not inserted, so the platform modules in it can't shadow the standard library.
+"""
+import os
+import sys
+
+INTEGRATION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "custom_components", "modbus_devices")
+if INTEGRATION_PATH not in sys.path:
+    sys.path.append(INTEGRATION_PATH)
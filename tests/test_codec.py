@@ -0,0 +1,109 @@
+"""Converting between registers and datapoint values."""
+import pytest
+
+from devices.codec import BitBlockDecoder, BlockDecoder, ModbusCodec
+from devices.datatypes import ModbusDatapoint, ModbusFormat, ModbusGroup, ModbusMode, ModbusOrder, ModbusPollMode
+
+@pytest.mark.parametrize("fmt, registers, value", [
+    (ModbusFormat.UINT16, [0xFFFF], 65535),
+    (ModbusFormat.INT16, [0xFFFF], -1),
+    (ModbusFormat.UINT32, [0x0001, 0x0002], 0x00010002),
+    (ModbusFormat.INT32, [0xFFFF, 0xFFFE], -2),
+    (ModbusFormat.UINT64, [0x0001, 0x0002, 0x0003, 0x0004], 0x0001000200030004),
+    (ModbusFormat.INT64, [0xFFFF, 0xFFFF, 0xFFFF, 0xFFFD], -3),
+    (ModbusFormat.FLOAT32, [0x3FC0, 0x0000], 1.5),
+    (ModbusFormat.FLOAT64, [0xC004, 0x0000, 0x0000, 0x0000], -2.5),
+])
+def test_numeric_formats_round_trip(fmt, registers, value):
+    codec = ModbusCodec(ModbusDatapoint(Format=fmt))
+    assert codec.decode(registers) == value
+    assert codec.encode(value) == registers
+
+def test_default_formats_follow_the_length():
+    assert ModbusCodec(ModbusDatapoint(Length=1)).decode([0xFFFF]) == -1
+    assert ModbusCodec(ModbusDatapoint(Length=2)).decode([0xFFFF, 0xFFFF]) == -1
+    assert ModbusCodec(ModbusDatapoint(Length=3)).decode([ord("a"), ord("b"), 0]) == "ab"
+
+def test_strings_round_trip():
+    string = ModbusCodec(ModbusDatapoint(Length=4, Format=ModbusFormat.STRING))
+    assert string.encode("abcdef") == [ord("a"), ord("b"), ord("c"), ord("d")]
+    assert string.decode(string.encode("ab")) == "ab"
+
+    ascii = ModbusCodec(ModbusDatapoint(Length=2, Format=ModbusFormat.ASCII))
+    assert ascii.encode("abc") == [0x6162, 0x6300]
+    assert ascii.decode([0x6162, 0x6300]) == "abc"
+
+def test_scaling():
+    codec = ModbusCodec(ModbusDatapoint(Format=ModbusFormat.INT16, Scaling=0.1))
+    assert codec.decode([0xFFF6]) == pytest.approx(-1.0)
+    assert codec.encode(-1.0) == [0xFFF6]
+    assert codec.encode(21.46) == [215]
+
+@pytest.mark.parametrize("byte_order, word_order, registers", [
+    (ModbusOrder.BIG, ModbusOrder.BIG, [0x1234, 0x5678]),
+    (ModbusOrder.BIG, ModbusOrder.LITTLE, [0x5678, 0x1234]),
+    (ModbusOrder.LITTLE, ModbusOrder.BIG, [0x3412, 0x7856]),
+    (ModbusOrder.LITTLE, ModbusOrder.LITTLE, [0x7856, 0x3412]),
+])
+def test_byte_and_word_order(byte_order, word_order, registers):
+    codec = ModbusCodec(ModbusDatapoint(Format=ModbusFormat.UINT32, ByteOrder=byte_order, WordOrder=word_order))
+    assert codec.native == (byte_order == word_order == ModbusOrder.BIG)
+    assert codec.decode(registers) == 0x12345678
+    assert codec.encode(0x12345678) == registers
+
+def test_word_order_does_not_apply_to_single_registers():
+    codec = ModbusCodec(ModbusDatapoint(Format=ModbusFormat.UINT16, WordOrder=ModbusOrder.LITTLE))
+    assert codec.native
+    assert codec.decode([0x1234]) == 0x1234
+
+def test_bit_fields():
+    codec = ModbusCodec(ModbusDatapoint(Bit=4, BitLength=3))
+    assert codec.decode([0b1111_0101_1111]) == 0b101
+    assert codec.encode(0b010, current=0b1111_0101_1111) == [0b1111_0010_1111]
+    with pytest.raises(ValueError):
+        codec.encode(8, current=0)
+
+def test_bit_fields_in_little_endian_registers():
+    codec = ModbusCodec(ModbusDatapoint(Bit=8, ByteOrder=ModbusOrder.LITTLE))
+    assert codec.decode([0x0001]) == 1
+    assert codec.encode(0, current=0x0301) == [0x0300]
+
+def test_bit_fields_must_fit_in_a_register():
+    with pytest.raises(ValueError):
+        ModbusDatapoint(Bit=12, BitLength=5)
+
+@pytest.mark.parametrize("length, value, registers", [
+    (1, -1, [0xFFFF]),
+    (1, 65535, [0xFFFF]),
+    (2, -2, [0xFFFF, 0xFFFE]),
+    (2, 0xFFFFFFFF, [0xFFFF, 0xFFFF]),
+])
+def test_unformatted_writes_accept_signed_and_unsigned_values(length, value, registers):
+    assert ModbusCodec(ModbusDatapoint(Length=length)).encode(value) == registers
+
+@pytest.mark.parametrize("dp, value", [
+    (ModbusDatapoint(), 65536),
+    (ModbusDatapoint(), -32769),
+    (ModbusDatapoint(Format=ModbusFormat.INT16), 65535),
+    (ModbusDatapoint(Format=ModbusFormat.UINT16), -1),
+])
+def test_out_of_range_writes_are_rejected(dp, value):
+    with pytest.raises(ValueError):
+        ModbusCodec(dp).encode(value)
+
+def test_block_decoder_skips_gaps_and_reads_overlaps():
+    group = ModbusGroup(ModbusMode.HOLDING, ModbusPollMode.POLL_ON)
+    word = ModbusDatapoint(Address=10, Format=ModbusFormat.UINT32, WordOrder=ModbusOrder.LITTLE)
+    high = ModbusDatapoint(Address=11, Format=ModbusFormat.UINT16)
+    flag = ModbusDatapoint(Address=11, Bit=15)
+    text = ModbusDatapoint(Address=13, Length=2, Format=ModbusFormat.ASCII)
+    decoder = BlockDecoder(10, 5, [(group, "word", word), (group, "high", high), (group, "flag", flag), (group, "text", text)])
+
+    decoder.decode([0x5678, 0x8234, 0xFFFF, 0x6F6B, 0x0000])
+    assert (word.Value, high.Value, flag.Value, text.Value) == (0x82345678, 0x8234, 1, "ok")
+
+def test_bit_block_decoder():
+    group = ModbusGroup(ModbusMode.COIL, ModbusPollMode.POLL_ON)
+    first, second = ModbusDatapoint(Address=20), ModbusDatapoint(Address=23)
+    BitBlockDecoder(20, [(group, "first", first), (group, "second", second)]).decode([True, False, False, False])
+    assert (first.Value, second.Value) == (1, 0)
@@ -0,0 +1,73 @@
+"""Coordinator write path, with tasks started lazily and eagerly like Home Assistant does.
+
+Uses the hass fixture of pytest-homeassistant-custom-component, see requirements_test.txt.
+"""
+import asyncio
+
+from functools import partial
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from custom_components.modbus_devices.coordinator import ModbusCoordinator
+from custom_components.modbus_devices.devices.datatypes import ModbusGroup, ModbusMode, ModbusPollMode, ModbusWatch
+
+class FakeDevice():
+    watches = []
+
+    def __init__(self):
+        self.writes = []
+
+    async def writeValues(self, writes):
+        self.writes.append(writes)
+        return [None] * len(writes)
+
+    async def readBack(self, written):
+        return set()
+
+@pytest.fixture(params=[False, True], ids=["lazy", "eager"])
+def coordinator(hass, request, monkeypatch):
+    monkeypatch.setattr(hass, "async_create_task", partial(hass.async_create_task, eager_start=request.param))
+    device = SimpleNamespace(id="device", name="Device", identifiers={("modbus_devices", "device")})
+    coordinator = ModbusCoordinator(hass, device, "Trox.TVE", None, 300, 5)
+    # Set up by _async_setup from the driver, which would need a bus
+    coordinator._modbusDevice = FakeDevice()
+    return coordinator
+
+@pytest.mark.asyncio
+async def test_writes_in_a_row(coordinator):
+    await asyncio.wait_for(coordinator.write_value("group", "a", 1), 1)
+    await asyncio.wait_for(coordinator.write_value("group", "b", 2), 1)
+    assert coordinator._modbusDevice.writes == [[("group", "a", 1)], [("group", "b", 2)]]
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_a_flush(coordinator):
+    await asyncio.wait_for(asyncio.gather(
+        coordinator.write_value("group", "a", 1),
+        coordinator.write_value("group", "b", 2),
+        coordinator.write_value("group", "a", 3),
+    ), 1)
+    assert coordinator._modbusDevice.writes == [[("group", "a", 3), ("group", "b", 2)]]
+
+@pytest.mark.asyncio
+async def test_debounced_writes_keep_the_newest_value(coordinator):
+    first = asyncio.ensure_future(coordinator.write_value("group", "a", 1, debounce=True))
+    await asyncio.sleep(0.1)
+    second = asyncio.ensure_future(coordinator.write_value("group", "a", 2, debounce=True))
+    await asyncio.sleep(0)
+    assert coordinator.get_value("group", "a") == 2
+    await asyncio.wait_for(asyncio.gather(first, second), 3)
+    assert coordinator._modbusDevice.writes == [[("group", "a", 2)]]
+
+@pytest.mark.asyncio
+async def test_watches_start_only_for_their_own_group(coordinator):
+    # Equal mode and poll mode make the groups compare equal
+    first, second = ModbusGroup(ModbusMode.HOLDING, ModbusPollMode.POLL_ON), ModbusGroup(ModbusMode.HOLDING, ModbusPollMode.POLL_ON)
+    watches = [ModbusWatch(Triggers=[(group, "setpoint")], Datapoints=[(group, "actual")]) for group in (first, second)]
+    coordinator._modbusDevice.watches = watches
+
+    coordinator._start_watches([(first, "setpoint")])
+    coordinator._watch_task.cancel()
+    assert [active[0] is watches[0] for active in coordinator._active_watches] == [True]
@@ -0,0 +1,82 @@
+"""Read planning: which blocks are read, and how they are decoded."""
+import pytest
+
+from devices.datatypes import ModbusDatapoint, ModbusFormat, ModbusGroup, ModbusMode, ModbusPollMode
+from devices.planner import DEFAULT_MAX_READ_GAP, MAX_BITS_PER_READ, MAX_REGISTERS_PER_READ, max_gap_for_link, plan_reads
+
+def spans(blocks):
+    return [(block.mode, block.address, block.count) for block in blocks]
+
+def holding():
+    return ModbusGroup(ModbusMode.HOLDING, ModbusPollMode.POLL_ON)
+
+def test_gap_for_link_grows_with_response_delay():
+    assert max_gap_for_link(9600, 0) == 10
+    assert max_gap_for_link(9600, 0.05) > max_gap_for_link(9600, 0.01) > max_gap_for_link(9600, 0)
+
+def test_gap_for_link_is_independent_of_baud_rate_without_response_delay():
+    assert max_gap_for_link(2400, 0) == max_gap_for_link(115200, 0) == DEFAULT_MAX_READ_GAP
+
+def test_contiguous_datapoints_are_read_at_once():
+    group = holding()
+    datapoints = {group: {"a": ModbusDatapoint(Address=10), "b": ModbusDatapoint(Address=11, Length=2), "c": ModbusDatapoint(Address=13)}}
+    assert spans(plan_reads([group], datapoints)) == [(ModbusMode.HOLDING, 10, 4)]
+
+@pytest.mark.parametrize("max_gap, expected", [
+    (0, [(ModbusMode.HOLDING, 0, 1), (ModbusMode.HOLDING, 5, 1)]),
+    (3, [(ModbusMode.HOLDING, 0, 1), (ModbusMode.HOLDING, 5, 1)]),
+    (4, [(ModbusMode.HOLDING, 0, 6)]),
+])
+def test_gaps_up_to_max_gap_are_read_through(max_gap, expected):
+    group = holding()
+    datapoints = {group: {"a": ModbusDatapoint(Address=0), "b": ModbusDatapoint(Address=5)}}
+    assert spans(plan_reads([group], datapoints, max_gap)) == expected
+
+def test_groups_of_the_same_mode_share_reads():
+    first, second = holding(), holding()
+    datapoints = {first: {"a": ModbusDatapoint(Address=0)}, second: {"a": ModbusDatapoint(Address=1)}}
+    blocks = plan_reads([first, second], datapoints)
+    assert spans(blocks) == [(ModbusMode.HOLDING, 0, 2)]
+    assert [(group, key) for group, key, _ in blocks[0].datapoints] == [(first, "a"), (second, "a")]
+
+def test_modes_are_never_merged():
+    registers, inputs = holding(), ModbusGroup(ModbusMode.INPUT, ModbusPollMode.POLL_ON)
+    datapoints = {registers: {"a": ModbusDatapoint(Address=0)}, inputs: {"a": ModbusDatapoint(Address=1)}}
+    assert spans(plan_reads([registers, inputs], datapoints, 10)) == [(ModbusMode.INPUT, 1, 1), (ModbusMode.HOLDING, 0, 1)]
+
+def test_reads_are_split_at_the_register_limit():
+    group = holding()
+    datapoints = {group: {str(address): ModbusDatapoint(Address=address) for address in range(MAX_REGISTERS_PER_READ + 1)}}
+    assert spans(plan_reads([group], datapoints)) == [(ModbusMode.HOLDING, 0, MAX_REGISTERS_PER_READ), (ModbusMode.HOLDING, MAX_REGISTERS_PER_READ, 1)]
+
+def test_datapoints_are_never_split_between_reads():
+    group = holding()
+    datapoints = {group: {"a": ModbusDatapoint(Address=0, Length=124), "b": ModbusDatapoint(Address=124, Format=ModbusFormat.UINT32)}}
+    assert spans(plan_reads([group], datapoints)) == [(ModbusMode.HOLDING, 0, 124), (ModbusMode.HOLDING, 124, 2)]
+
+def test_datapoints_longer_than_a_read_are_rejected():
+    group = holding()
+    with pytest.raises(ValueError):
+        plan_reads([group], {group: {"a": ModbusDatapoint(Length=MAX_REGISTERS_PER_READ + 1)}})
+
+def test_bit_gaps_count_sixteen_bits_per_register():
+    group = ModbusGroup(ModbusMode.COIL, ModbusPollMode.POLL_ON)
+    datapoints = {group: {"a": ModbusDatapoint(Address=0), "b": ModbusDatapoint(Address=33)}}
+    assert spans(plan_reads([group], datapoints, 2)) == [(ModbusMode.COIL, 0, 34)]
+    assert spans(plan_reads([group], datapoints, 1)) == [(ModbusMode.COIL, 0, 1), (ModbusMode.COIL, 33, 1)]
+
+def test_bit_reads_are_split_at_the_bit_limit():
+    group = ModbusGroup(ModbusMode.DISCRETE_INPUT, ModbusPollMode.POLL_ON)
+    datapoints = {group: {"a": ModbusDatapoint(Address=0), "b": ModbusDatapoint(Address=MAX_BITS_PER_READ)}}
+    assert spans(plan_reads([group], datapoints, 200)) == [(ModbusMode.DISCRETE_INPUT, 0, 1), (ModbusMode.DISCRETE_INPUT, MAX_BITS_PER_READ, 1)]
+
+def test_blocks_decode_their_datapoints():
+    group = holding()
+    datapoints = {group: {
+        "a": ModbusDatapoint(Address=0, Format=ModbusFormat.UINT16),
+        "b": ModbusDatapoint(Address=3, Format=ModbusFormat.INT32, Scaling=0.1),
+    }}
+    block, = plan_reads([group], datapoints, 2)
+    block.decoder.decode([7, 0xDEAD, 0xBEEF, 0xFFFF, 0xFFF6])
+    assert datapoints[group]["a"].Value == 7
+    assert datapoints[group]["b"].Value == pytest.approx(-1.0)